@@ -0,0 +1,130 @@
+"""
+Account deletion with set-based DELETEs.
+
+Every table owned by the user (a user_id column, or a foreign key into such a table,
+like exercises -> workout_sessions) is emptied child-first with one DELETE per table,
+then the users row goes. Small accounts are deleted inside the request; big ones are
+marked in account_deletions, logged out, and purged in chunks by a background thread
+(one short transaction per chunk). Resume purges interrupted by a restart with:
+
+    python account.py purge [--user USER_ID]
+"""
+import argparse
+import os
+import threading
+from typing import Optional
+
+from models import AccountDeletion, LegacySessionDB, SessionDB, User, engine, init_db
+from sqlalchemy import Table, delete, func, select
+from sqlmodel import Session, SQLModel
+
+# Iznad ovoliko redova brisanje ide u pozadini, u delovima
+ACCOUNT_DELETE_SYNC_LIMIT = int(os.getenv("ACCOUNT_DELETE_SYNC_LIMIT", "5000"))
+ACCOUNT_DELETE_CHUNK_SIZE = int(os.getenv("ACCOUNT_DELETE_CHUNK_SIZE", "1000"))
+
+SKIP_TABLES = {User.__tablename__, AccountDeletion.__tablename__}
+
+
+def _owned_where(table: Table, user_id: int):
+    """WHERE clause selecting the user's rows in `table`, or None if the table isn't user-owned."""
+    if "user_id" in table.c:
+        return table.c.user_id == user_id
+    for fk in table.foreign_keys:
+        parent = fk.column.table
+        if "user_id" in parent.c:
+            return fk.parent.in_(select(fk.column).where(parent.c.user_id == user_id))
+    return None
+
+
+def owned_tables(user_id: int) -> list[tuple[Table, object]]:
+    """(table, where) for every user-owned table, children before parents."""
+    owned = []
+    for table in reversed(SQLModel.metadata.sorted_tables):
+        if table.name in SKIP_TABLES:
+            continue
+        where = _owned_where(table, user_id)
+        if where is not None:
+            owned.append((table, where))
+    return owned
+
+
+def count_rows(session: Session, user_id: int, limit: int) -> int:
+    """Count the user's rows, but stop once the total passes `limit` (each probe is LIMITed)."""
+    total = 0
+    for table, where in owned_tables(user_id):
+        probe = select(table.c[list(table.primary_key.columns)[0].name]).where(where).limit(limit - total + 1)
+        total += session.execute(select(func.count()).select_from(probe.subquery())).scalar_one()
+        if total > limit:
+            break
+    return total
+
+
+def delete_user(session: Session, user_id: int) -> None:
+    """Delete everything the user owns and the user itself, one DELETE per table, in the caller's transaction."""
+    for table, where in owned_tables(user_id):
+        session.execute(delete(table).where(where))
+    session.execute(delete(AccountDeletion.__table__).where(AccountDeletion.__table__.c.user_id == user_id))
+    session.execute(delete(User.__table__).where(User.__table__.c.id == user_id))
+
+
+def schedule_deletion(session: Session, user_id: int) -> None:
+    """Mark the account for background purge and drop its sessions so it is logged out everywhere."""
+    session.add(AccountDeletion(user_id=user_id))
+    for model in (SessionDB, LegacySessionDB):
+        session.execute(delete(model).where(model.user_id == user_id))
+
+
+def purge_user(user_id: int, chunk_size: int = ACCOUNT_DELETE_CHUNK_SIZE) -> None:
+    """Delete a scheduled account in chunks, committing after each so no lock is held for long."""
+    with Session(engine) as session:
+        for table, where in owned_tables(user_id):
+            pk = list(table.primary_key.columns)
+            if len(pk) != 1:
+                # Složeni ključ (npr. user_daily_stats): red po danu, dovoljno malo za jedan DELETE
+                session.execute(delete(table).where(where))
+                session.commit()
+                continue
+
+            while True:
+                # MySQL ne dozvoljava LIMIT u IN (...) podupitu, pa prvo čitamo id-jeve
+                ids = session.execute(select(pk[0]).where(where).limit(chunk_size)).scalars().all()
+                if not ids:
+                    break
+                session.execute(delete(table).where(pk[0].in_(ids)))
+                session.commit()
+
+        delete_user(session, user_id)
+        session.commit()
+
+
+def purge_in_background(user_id: int) -> threading.Thread:
+    thread = threading.Thread(target=purge_user, args=(user_id,), name=f"purge-user-{user_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def pending_deletions(session: Session, user_id: Optional[int] = None) -> list[int]:
+    query = select(AccountDeletion.user_id)
+    if user_id is not None:
+        query = query.where(AccountDeletion.user_id == user_id)
+    return list(session.execute(query).scalars())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain account deletions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    purge_parser = sub.add_parser("purge", help="finish scheduled account deletions")
+    purge_parser.add_argument("--user", type=int, default=None, help="only purge this user")
+    args = parser.parse_args()
+
+    init_db()
+    with Session(engine) as session:
+        user_ids = pending_deletions(session, args.user)
+    for user_id in user_ids:
+        purge_user(user_id)
+        print(f"Purged user {user_id}")
+    print(f"Purged {len(user_ids)} accounts")
+
+
+if __name__ == "__main__":
+    main()
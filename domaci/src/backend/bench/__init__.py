@@ -0,0 +1 @@
+"""Benchmarks and load tests for the HZS API. Run modules from the backend directory, e.g. `python -m bench.explain_indexes`."""
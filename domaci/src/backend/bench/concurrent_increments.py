@@ -0,0 +1,93 @@
+"""
+Hammer one study session and one workout from many threads and check that no
+increment is lost (pomodoro_count and total_calories_burned must equal the
+number of successful requests).
+
+    python -m bench.concurrent_increments [--url mysql+pymysql://...] [--threads 16] [--requests 25]
+
+Exits with status 1 on a lost update.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=25, help="requests per thread")
+    return parser.parse_args()
+
+
+args = parse_args()
+if not args.url:
+    args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "concurrency.db")
+os.environ["DATABASE_URL"] = args.url
+os.environ.setdefault("ENV", "development")
+
+from models import StudySession, WorkoutSession, engine  # noqa: E402
+from server import app  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+CALORIES = 1.5
+
+
+def login(client) -> None:
+    credentials = {"email": "hammer@bench.local", "password_hash": "x"}
+    if client.post("/login", json=credentials).status_code != 200:
+        client.post("/register", json={**credentials, "username": "hammer", "full_name": "Hammer"})
+
+
+def main():
+    setup = app.test_client()
+    login(setup)
+    study_id = setup.post("/study/start").get_json()["session_id"]
+    workout_id = setup.post("/workout/start").get_json()["session_id"]
+
+    ok = {"pomodoro": 0, "exercise": 0}
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        login(client)
+        for _ in range(args.requests):
+            r1 = client.post(f"/study/{study_id}/pomodoro")
+            r2 = client.post(f"/workout/{workout_id}/exercise", json={
+                "exercise_type": "pushup", "reps": 1, "duration": 0, "calories_burned": CALORIES
+            })
+            with lock:
+                ok["pomodoro"] += r1.status_code == 200
+                ok["exercise"] += r2.status_code == 201
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with Session(engine) as session:
+        study = session.get(StudySession, study_id)
+        workout = session.get(WorkoutSession, workout_id)
+        pomodoros = study.pomodoro_count if study else 0
+        calories = workout.total_calories_burned if workout else 0.0
+
+    attempted = args.threads * args.requests
+    print(f"pomodoro: {ok['pomodoro']}/{attempted} succeeded, stored count {pomodoros}")
+    print(f"exercise: {ok['exercise']}/{attempted} succeeded, stored calories {calories} "
+          f"(expected {ok['exercise'] * CALORIES})")
+
+    if pomodoros != ok["pomodoro"] or abs(calories - ok["exercise"] * CALORIES) > 1e-6:
+        print("LOST UPDATES")
+        sys.exit(1)
+    # Bez ovoga bi 0 uspešnih i 0 upisanih prošlo kao "OK"
+    if ok["pomodoro"] < attempted or ok["exercise"] < attempted:
+        print("FAILED REQUESTS: not every increment succeeded, so lost updates can't be ruled out")
+        sys.exit(1)
+    print("OK: no lost updates")
+
+
+if __name__ == "__main__":
+    main()
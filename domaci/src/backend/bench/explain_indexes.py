@@ -0,0 +1,146 @@
+"""
+Print EXPLAIN plans for the app's hot query shapes before and after the composite
+(user_id, <time column>) indexes from models.py.
+
+Builds its own scratch database (SQLite temp file by default; pass --url for a
+throwaway MySQL schema, NEVER the production one, all tables are dropped):
+
+    python -m bench.explain_indexes [--url mysql+pymysql://...] [--users 200] [--rows 50]
+"""
+import argparse
+import os
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=50, help="rows per user per table")
+    return parser.parse_args()
+
+
+args = parse_args()
+if not args.url:
+    args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "explain.db")
+os.environ["DATABASE_URL"] = args.url
+
+from migrate import add_composite_indexes  # noqa: E402
+from models import (  # noqa: E402
+    FocusSession,
+    GratitudeEntry,
+    MoodCheckin,
+    StressJournal,
+    StudySession,
+    StudyTask,
+    User,
+    WaterIntake,
+    WorkoutSession,
+    engine,
+)
+from sqlalchemy import Index, MetaData, UniqueConstraint, insert, text  # noqa: E402
+from sqlmodel import SQLModel, desc, select  # noqa: E402
+
+USER_ID = 1
+SINCE = datetime.now() - timedelta(days=6)
+
+QUERIES = {
+    "workout history": select(WorkoutSession).where(WorkoutSession.user_id == USER_ID)
+    .order_by(desc(WorkoutSession.start_time)).limit(20),
+    "study history": select(StudySession).where(StudySession.user_id == USER_ID)
+    .order_by(desc(StudySession.start_time)).limit(20),
+    "study tasks": select(StudyTask).where(StudyTask.user_id == USER_ID).order_by(desc(StudyTask.created_at)),
+    "focus history": select(FocusSession).where(FocusSession.user_id == USER_ID)
+    .order_by(desc(FocusSession.completed_at)).limit(20),
+    "mood recent": select(MoodCheckin).where(MoodCheckin.user_id == USER_ID, MoodCheckin.created_at >= SINCE)
+    .order_by(desc(MoodCheckin.created_at)),
+    "journal recent": select(StressJournal).where(StressJournal.user_id == USER_ID)
+    .order_by(desc(StressJournal.created_at)).limit(10),
+    "gratitude recent": select(GratitudeEntry).where(GratitudeEntry.user_id == USER_ID, GratitudeEntry.date >= SINCE.date())
+    .order_by(desc(GratitudeEntry.date)),
+    "water today": select(WaterIntake).where(WaterIntake.user_id == USER_ID, WaterIntake.date == date.today()),
+}
+
+
+def create_unindexed_schema(conn) -> None:
+    """Tables as they exist in production today: only the per-FK user_id index."""
+    before = MetaData()
+    for table in SQLModel.metadata.sorted_tables:
+        copy = table.to_metadata(before)
+        copy.indexes.clear()
+        for constraint in list(copy.constraints):
+            if isinstance(constraint, UniqueConstraint) and len(constraint.columns) > 1:
+                copy.constraints.remove(constraint)
+        if "user_id" in copy.c and conn.dialect.name != "mysql":
+            # MySQL ga pravi sam za FK, SQLite ne
+            Index(f"ix_{copy.name}_user_id", copy.c.user_id)
+    before.create_all(conn)
+
+
+def seed(conn, users: int, rows: int) -> None:
+    rnd = random.Random(42)
+    now = datetime.now()
+    conn.execute(insert(User.__table__), [
+        {"id": u, "username": f"u{u}", "email": f"u{u}@bench.local", "full_name": "Bench", "password_hash": "x",
+         "created_at": now}
+        for u in range(1, users + 1)
+    ])
+    for u in range(1, users + 1):
+        times = [now - timedelta(minutes=rnd.randint(0, 60 * 24 * 365 * 2)) for _ in range(rows)]
+        conn.execute(insert(WorkoutSession.__table__), [
+            {"user_id": u, "start_time": t, "total_duration": 1800, "total_calories_burned": 200.0} for t in times])
+        conn.execute(insert(StudySession.__table__), [
+            {"user_id": u, "start_time": t, "total_duration": 3600, "pomodoro_count": 2, "distraction_count": 1}
+            for t in times])
+        conn.execute(insert(StudyTask.__table__), [
+            {"user_id": u, "task_name": "task", "estimated_time": 30, "completed": False, "created_at": t}
+            for t in times])
+        conn.execute(insert(FocusSession.__table__), [
+            {"user_id": u, "session_type": "breathing", "duration": 300, "completed_at": t} for t in times])
+        conn.execute(insert(MoodCheckin.__table__), [
+            {"user_id": u, "mood_score": rnd.randint(1, 5), "created_at": t} for t in times])
+        conn.execute(insert(StressJournal.__table__), [
+            {"user_id": u, "entry_text": "entry", "created_at": t} for t in times])
+        days = sorted({t.date() for t in times})
+        conn.execute(insert(GratitudeEntry.__table__), [
+            {"user_id": u, "entry_text": "thanks", "created_at": now, "date": d} for d in days])
+        conn.execute(insert(WaterIntake.__table__), [
+            {"user_id": u, "glasses": rnd.randint(0, 12), "date": d, "logged_at": now} for d in days])
+
+
+def explain(conn) -> dict[str, list[str]]:
+    prefix = "EXPLAIN " if conn.dialect.name == "mysql" else "EXPLAIN QUERY PLAN "
+    plans = {}
+    for name, stmt in QUERIES.items():
+        compiled = stmt.compile()
+        result = conn.execute(text(prefix + str(compiled)), compiled.params)
+        keys = list(result.keys())
+        plans[name] = [", ".join(f"{k}={v}" for k, v in zip(keys, row) if v is not None) for row in result]
+    return plans
+
+
+def main():
+    print(f"Scratch database: {args.url}")
+    with engine.begin() as conn:
+        SQLModel.metadata.drop_all(conn)
+        create_unindexed_schema(conn)
+        seed(conn, args.users, args.rows)
+        before = explain(conn)
+
+        add_composite_indexes(conn)
+        if conn.dialect.name != "mysql":
+            conn.execute(text("ANALYZE"))
+        after = explain(conn)
+
+    for name in QUERIES:
+        print(f"\n== {name}")
+        for line in before[name]:
+            print(f"  before: {line}")
+        for line in after[name]:
+            print(f"  after:  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Stream /account/export for one synthetic user with a very long history and report
+peak RSS above the pre-export baseline, so the export must stay flat as rows grow.
+
+    python -m bench.export_rss [--url mysql+pymysql://...] [--rows 1000000] [--materialize]
+
+--materialize additionally builds the whole export in memory (the jsonify-over-.all()
+approach) for comparison. RSS is read from /proc, so it needs Linux.
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="total rows to seed for the user")
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson")
+    parser.add_argument("--materialize", action="store_true", help="also measure building the export in memory")
+    return parser.parse_args()
+
+
+args = parse_args()
+if not args.url:
+    args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "export.db")
+os.environ["DATABASE_URL"] = args.url
+os.environ.setdefault("ENV", "development")
+
+import export  # noqa: E402
+from models import Exercise, MoodCheckin, StudySession, WorkoutSession, engine  # noqa: E402
+from server import app  # noqa: E402
+from sqlmodel import Session, insert, select  # noqa: E402
+
+CHUNK = 10_000
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE / 1024 / 1024
+
+
+def seed(user_id: int, rows: int) -> None:
+    """Mostly exercises (the widest table in practice), plus sessions and mood check-ins."""
+    start = datetime.now() - timedelta(days=3650)
+    workouts = max(rows // 20, 1)
+    moods = rows // 10
+    studies = rows // 10
+    exercises = rows - workouts - moods - studies
+
+    with Session(engine) as session:
+        for offset in range(0, workouts, CHUNK):
+            session.execute(insert(WorkoutSession), [
+                {"user_id": user_id, "start_time": start + timedelta(hours=i), "total_calories_burned": 100.0}
+                for i in range(offset, min(offset + CHUNK, workouts))
+            ])
+        session.commit()
+        workout_ids = session.exec(select(WorkoutSession.id).where(WorkoutSession.user_id == user_id)).all()
+
+        for offset in range(0, exercises, CHUNK):
+            session.execute(insert(Exercise), [
+                {
+                    "session_id": workout_ids[i % len(workout_ids)],
+                    "exercise_type": "pushup",
+                    "reps": 20,
+                    "duration": 60,
+                    "calories_burned": 5.0,
+                    "completed_at": start + timedelta(minutes=i),
+                }
+                for i in range(offset, min(offset + CHUNK, exercises))
+            ])
+        for offset in range(0, moods, CHUNK):
+            session.execute(insert(MoodCheckin), [
+                {"user_id": user_id, "mood_score": i % 5 + 1, "notes": "synthetic", "created_at": start + timedelta(hours=i)}
+                for i in range(offset, min(offset + CHUNK, moods))
+            ])
+        for offset in range(0, studies, CHUNK):
+            session.execute(insert(StudySession), [
+                {"user_id": user_id, "start_time": start + timedelta(hours=i), "total_duration": 1500}
+                for i in range(offset, min(offset + CHUNK, studies))
+            ])
+        session.commit()
+
+
+def main():
+    client = app.test_client()
+    credentials = {"email": "export@bench.local", "password_hash": "x"}
+    user = client.post("/register", json={**credentials, "username": "export", "full_name": "Export"}).get_json()["user"]
+
+    started = time.perf_counter()
+    seed(user["id"], args.rows)
+    print(f"Seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    gc.collect()
+    baseline = peak = rss_mb()
+    started = time.perf_counter()
+    response = client.get(f"/account/export?format={args.format}", buffered=False)
+    total_bytes = 0
+    for chunk in response.response:
+        total_bytes += len(chunk)
+        peak = max(peak, rss_mb())
+    response.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"Streamed {total_bytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+    print(f"RSS baseline {baseline:.1f} MB, peak {peak:.1f} MB, growth {peak - baseline:.1f} MB")
+
+    if args.materialize:
+        gc.collect()
+        baseline = rss_mb()
+        everything = {name: list(rows) for name, rows in export.iter_tables(user["id"])}
+        document = export.dumps(everything)
+        print(f"Materialized: RSS growth {rss_mb() - baseline:.1f} MB for {len(document) / 1024 / 1024:.1f} MB of JSON")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Requests/sec and latency of the API under different server models, against the
+same scratch database:
+
+    flask-dev         the Werkzeug dev server (what `python server.py` runs)
+    gunicorn-sync     gunicorn, --workers processes, one request at a time each
+    gunicorn-gthread  gunicorn.conf.py: --workers processes x --threads threads
+
+    python -m bench.load_test [--url mysql+pymysql://...] [--models flask-dev,gunicorn-gthread]
+                              [--concurrency 32] [--duration 10] [--workers 4] [--threads 8]
+
+Each client thread keeps one HTTP/1.1 connection open and loops over an authenticated
+read mix (/stats/overview, /workout/history, /water/week) plus /health/db.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/stats/overview", "/workout/history", "/water/week", "/health/db"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--models", default="flask-dev,gunicorn-sync,gunicorn-gthread")
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per model")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=5099)
+    return parser.parse_args()
+
+
+def server_command(model: str, args) -> list[str]:
+    bind = f"127.0.0.1:{args.port}"
+    if model == "flask-dev":
+        return [sys.executable, "-m", "flask", "--app", "server", "run", "--port", str(args.port)]
+    if model == "gunicorn-sync":
+        return [sys.executable, "-m", "gunicorn", "-k", "sync", "-w", str(args.workers), "-b", bind, "wsgi:app"]
+    if model == "gunicorn-gthread":
+        return [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "-w", str(args.workers), "--threads", str(args.threads), "-b", bind, "wsgi:app",
+        ]
+    raise SystemExit(f"Unknown model: {model}")
+
+
+def wait_until_up(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server on port {port} did not come up")
+
+
+def login_cookie(port: int, email: str = "load@bench.local") -> str:
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    body = json.dumps({"email": email, "password_hash": "x", "username": "load", "full_name": "Load"})
+    headers = {"Content-Type": "application/json"}
+    conn.request("POST", "/login", body, headers)
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        conn.request("POST", "/register", body, headers)
+        response = conn.getresponse()
+        response.read()
+    return response.getheader("Set-Cookie").split(";")[0]
+
+
+def run_clients(
+    port: int, cookie: str, concurrency: int, duration: float, paths: list[str] = PATHS
+) -> tuple[int, int, list[float]]:
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset: int):
+        nonlocal errors
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine, failed, i = [], 0, offset
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", paths[i % len(paths)], headers={"Cookie": cookie})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            mine.append((time.perf_counter() - started) * 1000)
+            i += 1
+        with lock:
+            latencies.extend(mine)
+            errors += failed
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latencies), errors, latencies
+
+
+def main():
+    args = parse_args()
+    url = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+    env = {**os.environ, "DATABASE_URL": url, "ENV": "development", "SESSION_GC_INTERVAL": "0"}
+
+    print(f"{'model':<18} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for model in args.models.split(","):
+        process = subprocess.Popen(
+            server_command(model, args), cwd=BACKEND_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(args.port)
+            cookie = login_cookie(args.port)
+            run_clients(args.port, cookie, args.concurrency, 1)  # zagrevanje
+            total, errors, latencies = run_clients(args.port, cookie, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+
+        q = statistics.quantiles(latencies, n=100)
+        print(f"{model:<18} {total / args.duration:>9.0f} {q[49]:>8.1f} {q[94]:>8.1f} {q[98]:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
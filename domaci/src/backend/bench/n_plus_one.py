@@ -0,0 +1,103 @@
+"""
+Check that the N+1 detector (querydebug) catches a per-row query loop and leaves the
+connection clean behind it.
+
+    python -m bench.n_plus_one [--url mysql+pymysql://...] [--workouts 10] [--threshold 3]
+
+Seeds one user with --workouts workouts, then loads their exercises one workout at a
+time inside querydebug.track(raise_on_detect=True), which must raise NPlusOneError,
+and once more with a single IN (...) query, which must not. After each run the
+per-connection timing stacks of metrics.py and querydebug.py have to be empty.
+
+Exits with status 1 if the loop isn't flagged, the batched query is, or a stack leaks.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--workouts", type=int, default=10)
+    parser.add_argument("--threshold", type=int, default=3)
+    parsed = parser.parse_args()
+    if parsed.workouts <= parsed.threshold:
+        parser.error("--workouts must be larger than --threshold, or there is nothing to flag")
+    return parsed
+
+
+args = parse_args()
+if not args.url:
+    args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "n_plus_one.db")
+os.environ["DATABASE_URL"] = args.url
+os.environ.setdefault("ENV", "development")
+
+import querydebug  # noqa: E402
+from models import Exercise, WorkoutSession, engine  # noqa: E402
+from server import app  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+STACKS = ("query_start", "debug_query_start")
+
+
+def seed() -> int:
+    client = app.test_client()
+    credentials = {"email": "nplusone@bench.local", "password_hash": "x"}
+    response = client.post("/login", json=credentials)
+    if response.status_code != 200:
+        response = client.post("/register", json={**credentials, "username": "nplusone", "full_name": "N+1"})
+    user_id = response.get_json()["user"]["id"]
+
+    for _ in range(args.workouts):
+        workout_id = client.post("/workout/start").get_json()["session_id"]
+        client.post(f"/workout/{workout_id}/exercise", json={
+            "exercise_type": "pushup", "reps": 10, "duration": 30, "calories_burned": 5
+        })
+    return user_id
+
+
+def leaked(session: Session) -> dict:
+    info = session.connection().info
+    return {name: len(info[name]) for name in STACKS if info.get(name)}
+
+
+def main():
+    # Bez SQL_DEBUG server ne instrumentira engine, a track() bez toga ništa ne vidi
+    querydebug.instrument_engine(engine, slow_query_ms=None)
+    user_id = seed()
+    failures = []
+
+    with Session(engine) as session:
+        workout_ids = session.exec(select(WorkoutSession.id).where(WorkoutSession.user_id == user_id)).all()
+
+        try:
+            with querydebug.track(threshold=args.threshold, raise_on_detect=True) as tracker:
+                for workout_id in workout_ids:
+                    session.exec(select(Exercise).where(Exercise.session_id == workout_id)).all()
+        except querydebug.NPlusOneError as e:
+            print(f"per-row loop: flagged ({e})")
+        else:
+            failures.append(f"per-row loop over {len(workout_ids)} workouts was not flagged")
+        if leaked(session):
+            failures.append(f"per-row loop left timing stacks behind: {leaked(session)}")
+
+        with querydebug.track(threshold=args.threshold, raise_on_detect=True) as tracker:
+            session.exec(select(Exercise).where(Exercise.session_id.in_(workout_ids))).all()  # type: ignore
+        if tracker.repeated:
+            failures.append(f"batched query was flagged: {tracker.repeated}")
+        else:
+            print("batched query: not flagged")
+        if leaked(session):
+            failures.append(f"batched query left timing stacks behind: {leaked(session)}")
+
+    for failure in failures:
+        print("FAILED:", failure)
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
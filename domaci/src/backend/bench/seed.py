@@ -0,0 +1,313 @@
+"""
+Generate synthetic users with realistic histories (workouts with exercises, study
+sessions with tasks and streaks, focus, moods, journals, gratitude and water) into
+the database from DATABASE_URL, then rebuild the daily rollup. Deterministic for a given --seed.
+
+    DATABASE_URL=mysql+pymysql://... python -m bench.seed [--users 1000] [--years 2]
+        [--start 2024-01-01 --end 2025-12-31] [--profiles light=3,regular=5,heavy=2] [--seed 42]
+
+Each user is assigned one activity profile (see PROFILES) by the --profiles weights.
+Users are user<N>@bench.local with password_hash "x". Rows are written with explicit
+ids in chunked bulk INSERTs (executemany), so children never wait on a read-back;
+10M rows (about 2000 users of the default mix over 2 years) take a few minutes.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterator, NamedTuple, Optional
+
+import rollup
+from models import (
+    Exercise,
+    FocusSession,
+    GratitudeEntry,
+    MoodCheckin,
+    StressJournal,
+    StudySession,
+    StudyStreak,
+    StudyTask,
+    User,
+    WaterIntake,
+    WorkoutSession,
+    engine,
+    init_db,
+)
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, func, insert, select
+
+CHUNK = 5000
+PASSWORD_HASH = "x"
+EXERCISE_TYPES = ["pushup", "squat", "plank", "lunge", "burpee", "situp"]
+FOCUS_TYPES = ["breathing", "meditation", "ambient"]
+
+
+class Profile(NamedTuple):
+    """Per-day chance of each activity, and how much of it the user does when it happens."""
+    workout: float
+    exercises: tuple[int, int]
+    study: float
+    tasks: tuple[int, int]
+    focus: float
+    moods: tuple[int, int]
+    journal: float
+    gratitude: float
+    water: float
+    weekend: float  # množilac za trening i učenje vikendom
+
+
+PROFILES = {
+    "light": Profile(0.15, (1, 3), 0.25, (0, 1), 0.1, (0, 1), 0.05, 0.1, 0.5, 0.6),
+    "regular": Profile(0.45, (2, 6), 0.6, (0, 3), 0.4, (0, 2), 0.15, 0.3, 0.85, 0.8),
+    "heavy": Profile(0.8, (4, 10), 0.9, (1, 5), 0.7, (1, 4), 0.4, 0.6, 1.0, 1.0),
+}
+DEFAULT_MIX = {"light": 3, "regular": 5, "heavy": 2}
+
+
+def email_for(n: int) -> str:
+    return f"user{n}@bench.local"
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """"light=3,heavy=1" -> {"light": 3.0, "heavy": 1.0}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in PROFILES:
+            raise argparse.ArgumentTypeError(f"unknown profile {name!r} (choose from {', '.join(PROFILES)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Writer:
+    """Buffers rows per model and flushes each buffer as one executemany INSERT.
+
+    SQLAlchemy sends those as batched multi-row INSERT ... VALUES (insertmanyvalues)
+    from one cached compiled statement; insert().values([...]) would recompile a
+    5000-row VALUES clause on every flush, which costs more than the insert itself.
+    """
+
+    def __init__(self, session: Session, chunk_size: int = CHUNK):
+        self.session = session
+        self.chunk_size = chunk_size
+        self.buffers: dict = {}
+        self.counts: dict[str, int] = {}
+        self.next_ids: dict = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def next_id(self, model) -> int:
+        if model not in self.next_ids:
+            self.next_ids[model] = (self.session.exec(select(func.max(model.id))).one() or 0) + 1
+        value = self.next_ids[model]
+        self.next_ids[model] = value + 1
+        return value
+
+    def add(self, model, row: dict) -> None:
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every buffer, parents before children so FK checks pass (e.g. workouts before exercises)."""
+        order = {table: i for i, table in enumerate(SQLModel.metadata.sorted_tables)}
+        for m in sorted(self.buffers, key=lambda m: order[m.__table__]):
+            rows = self.buffers[m]
+            if rows:
+                self.session.execute(insert(m.__table__), rows)
+                self.counts[m.__tablename__] = self.counts.get(m.__tablename__, 0) + len(rows)
+                self.buffers[m] = []
+
+
+def days(start: date, end: date) -> Iterator[date]:
+    for offset in range((end - start).days + 1):
+        yield start + timedelta(days=offset)
+
+
+# rng.random() je nekoliko puta brži od randint, a generator je usko grlo, ne INSERT
+def between(rng: random.Random, bounds: tuple[int, int]) -> int:
+    low, high = bounds
+    return low + int(rng.random() * (high - low + 1))
+
+
+def at(day: date, rng: random.Random, hours: tuple[int, int] = (7, 22)) -> datetime:
+    seconds = hours[0] * 3600 + int(rng.random() * (hours[1] - hours[0] + 1) * 3600)
+    return datetime(day.year, day.month, day.day) + timedelta(seconds=seconds)
+
+
+def seed_user(w: Writer, rng: random.Random, user_id: int, profile: Profile, start: date, end: date) -> None:
+    streak = longest = 0
+    last_study = None
+
+    for day in days(start, end):
+        scale = profile.weekend if day.weekday() >= 5 else 1.0
+
+        if rng.random() < profile.workout * scale:
+            workout_id = w.next_id(WorkoutSession)
+            begin = at(day, rng)
+            exercises = [
+                {
+                    "id": w.next_id(Exercise), "session_id": workout_id,
+                    "exercise_type": rng.choice(EXERCISE_TYPES), "reps": between(rng, (5, 50)),
+                    "duration": between(rng, (30, 600)), "calories_burned": round(5 + rng.random() * 55, 1),
+                    "completed_at": begin + timedelta(minutes=5 * (i + 1)),
+                }
+                for i in range(between(rng, profile.exercises))
+            ]
+            duration = between(rng, (900, 4200))
+            # Trening ide u bafer pre svojih vežbi: add() može da flush-uje usred petlje
+            w.add(WorkoutSession, {
+                "id": workout_id, "user_id": user_id, "start_time": begin,
+                "end_time": begin + timedelta(seconds=duration), "total_duration": duration,
+                "total_calories_burned": round(sum(e["calories_burned"] for e in exercises), 1),
+            })
+            for exercise in exercises:
+                w.add(Exercise, exercise)
+
+        if rng.random() < profile.study * scale:
+            study_id = w.next_id(StudySession)
+            begin = at(day, rng, (8, 20))
+            duration = between(rng, (1500, 10800))
+            w.add(StudySession, {
+                "id": study_id, "user_id": user_id, "start_time": begin,
+                "end_time": begin + timedelta(seconds=duration), "total_duration": duration,
+                "pomodoro_count": duration // 1500, "distraction_count": between(rng, (0, 5)),
+            })
+            for _ in range(between(rng, profile.tasks)):
+                estimated = between(rng, (10, 120))
+                w.add(StudyTask, {
+                    "id": w.next_id(StudyTask), "user_id": user_id, "session_id": study_id,
+                    "task_name": f"Task {between(rng, (1, 9999))}", "estimated_time": estimated,
+                    "actual_time": estimated + between(rng, (-5, 30)), "completed": True,
+                    "created_at": begin, "completed_at": begin + timedelta(minutes=estimated),
+                })
+            streak = streak + 1 if last_study == day - timedelta(days=1) else 1
+            longest = max(longest, streak)
+            last_study = day
+
+        if rng.random() < profile.focus:
+            w.add(FocusSession, {
+                "id": w.next_id(FocusSession), "user_id": user_id, "session_type": rng.choice(FOCUS_TYPES),
+                "duration": between(rng, (60, 1800)), "completed_at": at(day, rng),
+            })
+
+        for _ in range(between(rng, profile.moods)):
+            w.add(MoodCheckin, {
+                "id": w.next_id(MoodCheckin), "user_id": user_id, "mood_score": between(rng, (1, 5)),
+                "notes": None, "created_at": at(day, rng),
+            })
+
+        if rng.random() < profile.journal:
+            w.add(StressJournal, {
+                "id": w.next_id(StressJournal), "user_id": user_id,
+                "entry_text": "Synthetic journal entry " * between(rng, (1, 20)), "created_at": at(day, rng),
+            })
+
+        if rng.random() < profile.gratitude:
+            w.add(GratitudeEntry, {
+                "id": w.next_id(GratitudeEntry), "user_id": user_id,
+                "entry_text": "Grateful for synthetic data", "created_at": at(day, rng), "date": day,
+            })
+
+        if rng.random() < profile.water:
+            w.add(WaterIntake, {
+                "id": w.next_id(WaterIntake), "user_id": user_id, "glasses": between(rng, (2, 12)),
+                "date": day, "logged_at": at(day, rng),
+            })
+
+    w.add(StudyStreak, {
+        "id": w.next_id(StudyStreak), "user_id": user_id,
+        "current_streak": streak if last_study == end else 0, "longest_streak": longest,
+        "last_study_date": last_study,
+    })
+
+
+def seed(
+    users: int,
+    years: float = 2,
+    seed_value: int = 42,
+    chunk_size: int = CHUNK,
+    mix: Optional[dict[str, float]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    progress: bool = False,
+) -> dict:
+    """Insert `users` users with history from `start` (default: `years` before `end`) to `end` (default: today).
+
+    Returns the first user id, users per profile and rows written per table.
+    """
+    rng = random.Random(seed_value)
+    mix = mix or DEFAULT_MIX
+    end = end or date.today()
+    start = start or end - timedelta(days=int(365 * years))
+    if start > end:
+        raise ValueError("start must not be after end")
+
+    names = list(mix)
+    assigned = rng.choices(names, weights=[mix[name] for name in names], k=users)
+    started = time.perf_counter()
+
+    with Session(engine) as session:
+        if engine.dialect.name == "sqlite":
+            # InnoDB uvek proverava strane ključeve; SQLite samo uz ovaj pragma, pa lokalni run hvata istu grešku
+            session.execute(text("PRAGMA foreign_keys = ON"))
+        w = Writer(session, chunk_size)
+        first = w.next_id(User)
+        for n in range(first, first + users):
+            w.add(User, {
+                "id": n, "username": f"user{n}", "email": email_for(n),
+                "full_name": f"Synthetic User {n}", "password_hash": PASSWORD_HASH,
+                "created_at": datetime.combine(start, datetime.min.time()),
+            })
+        w.next_ids[User] = first + users
+        w.flush()
+
+        report_every = max(1, users // 20)
+        for offset, name in enumerate(assigned):
+            seed_user(w, rng, first + offset, PROFILES[name], start, end)
+            if progress and (offset + 1) % report_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"  {offset + 1:>8,}/{users:,} users  {w.total:>12,} rows  {w.total / elapsed:>9,.0f} rows/s", flush=True)
+        w.flush()
+        session.commit()
+
+        if progress:
+            print("  rebuilding user_daily_stats...", flush=True)
+        rollup.backfill(session)
+        session.commit()
+
+    profiles = {name: assigned.count(name) for name in names}
+    return {"first_user_id": first, "users": users, "profiles": profiles, "rows": w.counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=float, default=2, help="history length when --start is not given")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day of history (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last day of history (default: today)")
+    parser.add_argument("--profiles", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"profile weights, e.g. light=3,regular=5,heavy=2 (profiles: {', '.join(PROFILES)})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK, help="rows per INSERT batch")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.perf_counter()
+    result = seed(
+        args.users, args.years, args.seed, args.chunk_size,
+        mix=args.profiles, start=args.start, end=args.end, progress=True,
+    )
+    total = sum(result["rows"].values())
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    print("  profiles: " + ", ".join(f"{name} {count}" for name, count in result["profiles"].items()))
+    for table, count in sorted(result["rows"].items()):
+        print(f"  {table:<20} {count:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Auth lookup latency with a large sessions table: the legacy VARCHAR(255) UUID-string
+primary key (sessions) against the BINARY(16) key (auth_sessions), plus the stateless
+token check that rejects expired cookies before any query.
+
+    python -m bench.session_lookup [--url mysql+pymysql://...] [--sessions 10000000] [--lookups 20000]
+
+Both tables get the same --sessions rows. On MySQL the on-disk size of each table
+(data + indexes) is printed too. Seeding 10M rows takes a while; use a smaller
+--sessions for a quick run.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--sessions", type=int, default=10_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1000)
+    return parser.parse_args()
+
+
+args = parse_args()
+if not args.url:
+    args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "sessions.db")
+os.environ["DATABASE_URL"] = args.url
+
+import tokens  # noqa: E402
+from models import LegacySessionDB, SessionDB, User, engine, init_db  # noqa: E402
+from sqlalchemy import insert, select, text  # noqa: E402
+
+CHUNK = 20_000
+
+
+def percentiles(samples: list[float]) -> str:
+    q = statistics.quantiles(samples, n=100)
+    return f"p50 {q[49]:.1f}us  p95 {q[94]:.1f}us  p99 {q[98]:.1f}us"
+
+
+def seed(conn) -> list[uuid.UUID]:
+    conn.execute(insert(User.__table__), [
+        {"username": f"u{i}", "email": f"u{i}@bench.local", "full_name": "Bench", "password_hash": "x", "created_at": datetime.now()}
+        for i in range(args.users)
+    ])
+    user_ids = conn.execute(select(User.__table__.c.id)).scalars().all()
+
+    now = datetime.now()
+    sample: list[uuid.UUID] = []
+    for offset in range(0, args.sessions, CHUNK):
+        batch = [uuid.uuid4() for _ in range(min(CHUNK, args.sessions - offset))]
+        common = [
+            {"user_id": user_ids[i % len(user_ids)], "created_at": now, "expires_at": now + timedelta(days=90), "is_valid": True}
+            for i in range(len(batch))
+        ]
+        conn.execute(insert(LegacySessionDB.__table__), [{"session_uuid": str(u), **c} for u, c in zip(batch, common)])
+        conn.execute(insert(SessionDB.__table__), [{"id": u.bytes, **c} for u, c in zip(batch, common)])
+        sample.extend(random.sample(batch, min(len(batch), max(1, args.lookups * CHUNK // args.sessions + 1))))
+    return sample
+
+
+def time_lookups(conn, query, keys) -> list[float]:
+    samples = []
+    for key in keys:
+        started = time.perf_counter()
+        row = conn.execute(query, {"key": key}).first()
+        samples.append((time.perf_counter() - started) * 1e6)
+        assert row is not None
+    return samples
+
+
+def table_sizes(conn) -> dict:
+    rows = conn.execute(text(
+        "SELECT table_name, data_length + index_length FROM information_schema.tables"
+        " WHERE table_schema = DATABASE() AND table_name IN ('sessions', 'auth_sessions')"
+    )).all()
+    return {name: f"{size / 1024 / 1024:.0f} MB" for name, size in rows}
+
+
+def main():
+    init_db()
+    with engine.begin() as conn:
+        started = time.perf_counter()
+        sample = seed(conn)
+        print(f"Seeded {args.sessions:,} sessions per table in {time.perf_counter() - started:.1f}s")
+
+    keys = random.choices(sample, k=args.lookups)
+    legacy_query = (
+        select(User.id, User.username, User.email, User.full_name, LegacySessionDB.expires_at)
+        .join(LegacySessionDB, LegacySessionDB.user_id == User.id)  # type: ignore
+        .where(LegacySessionDB.session_uuid == text(":key"), LegacySessionDB.is_valid == True)  # noqa: E712
+    )
+    binary_query = (
+        select(User.id, User.username, User.email, User.full_name, SessionDB.expires_at)
+        .join(SessionDB, SessionDB.user_id == User.id)  # type: ignore
+        .where(SessionDB.id == text(":key"), SessionDB.is_valid == True)  # noqa: E712
+    )
+
+    with engine.connect() as conn:
+        # Zagrevanje keša stranica za oba indeksa
+        time_lookups(conn, legacy_query, [str(k) for k in keys[:1000]])
+        time_lookups(conn, binary_query, [k.bytes for k in keys[:1000]])
+
+        print(f"VARCHAR(255) uuid PK : {percentiles(time_lookups(conn, legacy_query, [str(k) for k in keys]))}")
+        print(f"BINARY(16) PK        : {percentiles(time_lookups(conn, binary_query, [k.bytes for k in keys]))}")
+        if conn.dialect.name == "mysql":
+            print(f"Table sizes          : {table_sizes(conn)}")
+
+    expired = tokens.encode(uuid.uuid4().bytes, datetime.now() - timedelta(days=1))
+    samples = []
+    for _ in range(args.lookups):
+        started = time.perf_counter()
+        assert tokens.decode(expired) is None
+        samples.append((time.perf_counter() - started) * 1e6)
+    print(f"Expired token reject : {percentiles(samples)} (no query)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Benchmark every blueprint route against a seeded scratch database and save the
+results as JSON for run-to-run comparison.
+
+    python -m bench.suite [--url mysql+pymysql://...] [--users 200] [--years 1]
+                          [--iterations 50] [--http] [--out bench/results/run.json]
+                          [--compare bench/results/baseline.json]
+
+1. Seeds --users synthetic users with --years of history (bench.seed), unless --no-seed.
+2. Calls each route --iterations times through the Flask test client as a seeded user
+   and records p50/p95/p99 latency, throughput and SQL statements per request.
+3. With --http, also starts gunicorn (gthread) and drives the read routes with the
+   multi-threaded generator from bench.load_test.
+
+Routes missing from the catalog below are reported, so new endpoints don't go unmeasured.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, Optional
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="scratch database URL (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --url")
+    parser.add_argument("--iterations", type=int, default=50, help="test-client calls per route")
+    parser.add_argument("--http", action="store_true", help="also run the HTTP load generator against gunicorn")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--out", default=None, help="results file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to diff against")
+    return parser.parse_args()
+
+
+args = parse_args()
+if not args.url:
+    args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "suite.db")
+os.environ["DATABASE_URL"] = args.url
+os.environ.setdefault("ENV", "development")
+os.environ["SESSION_GC_INTERVAL"] = "0"
+# /metrics i /health/* su iza ops tokena (ops.py); suite ih meri sa svojim tokenom
+os.environ.setdefault("OPS_TOKEN", "bench")
+OPS_HEADERS = {"Authorization": f"Bearer {os.environ['OPS_TOKEN']}"}
+
+import querydebug  # noqa: E402
+from bench import load_test, seed  # noqa: E402
+from models import engine, init_db  # noqa: E402
+from server import app  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TODAY = date.today().isoformat()
+
+
+@dataclass
+class Case:
+    """One route call. `setup` runs untimed before each call and returns values for the path."""
+    name: str
+    rule: str
+    method: str
+    path: str
+    body: Optional[Callable[[dict], dict]] = None
+    setup: Optional[Callable] = None
+    read: bool = False
+    samples: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+
+def _post_id(client, path: str, key: str, body: Optional[dict] = None) -> int:
+    return client.post(path, json=body or {}).get_json()[key]
+
+
+def _fresh_login(client) -> dict:
+    stamp = time.perf_counter_ns()
+    client.post("/register", json={
+        "username": "tmp", "email": f"tmp{stamp}@bench.local", "full_name": "Tmp", "password_hash": "x"
+    })
+    return {}
+
+
+def catalog() -> list[Case]:
+    exercise = {"exercise_type": "pushup", "reps": 10, "duration": 30, "calories_burned": 5}
+    return [
+        Case("health", "/health", "GET", "/health", read=True),
+        Case("health_db", "/health/db", "GET", "/health/db", read=True),
+        Case("health_cache", "/health/cache", "GET", "/health/cache", read=True),
+        Case("health_sessions", "/health/sessions", "GET", "/health/sessions", read=True),
+        Case("metrics", "/metrics", "GET", "/metrics"),
+        Case("time", "/time", "GET", "/time", read=True),
+        Case("login", "/login", "POST", "/login", body=lambda c: {"email": c["email"], "password_hash": "x"}),
+        Case("register", "/register", "POST", "/register", body=lambda c: {
+            "username": "r", "email": f"r{time.perf_counter_ns()}@bench.local", "full_name": "R", "password_hash": "x"
+        }),
+        Case("account_get", "/account", "GET", "/account", read=True),
+        Case("account_put", "/account", "PUT", "/account", body=lambda c: {"full_name": "Synthetic User"}),
+        Case("account_export", "/account/export", "GET", "/account/export"),
+        Case("logout", "/logout", "POST", "/logout", setup=_fresh_login),
+        Case("account_delete", "/account", "DELETE", "/account", setup=_fresh_login),
+        Case("onboarding_post", "/onboarding", "POST", "/onboarding", body=lambda c: {
+            "categories": ["physical", "study"], "physical_goals": {"water_glasses_per_day": 8}
+        }),
+        Case("onboarding_get", "/onboarding", "GET", "/onboarding", read=True),
+        Case("goals", "/goals", "GET", "/goals", read=True),
+        Case("workout_start", "/workout/start", "POST", "/workout/start"),
+        Case("workout_exercise", "/workout/<int:session_id>/exercise", "POST", "/workout/{workout_id}/exercise",
+             body=lambda c: exercise),
+        Case("workout_exercises", "/workout/<int:session_id>/exercises", "POST", "/workout/{workout_id}/exercises",
+             body=lambda c: {"exercises": [exercise] * 5}),
+        Case("workout_complete", "/workout/<int:session_id>/complete", "POST", "/workout/{workout_id}/complete"),
+        Case("workout_history", "/workout/history", "GET", "/workout/history", read=True),
+        Case("workout_history_exercises", "/workout/history", "GET", "/workout/history?include=exercises", read=True),
+        Case("water_post", "/water", "POST", "/water", body=lambda c: {"glasses": 6, "date": TODAY}),
+        Case("water_today", "/water/today", "GET", "/water/today", read=True),
+        Case("water_week", "/water/week", "GET", "/water/week", read=True),
+        Case("stretch_remind", "/stretch/remind", "POST", "/stretch/remind"),
+        Case("stretch_complete", "/stretch/<int:reminder_id>/complete", "POST", "/stretch/{reminder_id}/complete",
+             setup=lambda client: {"reminder_id": _post_id(client, "/stretch/remind", "reminder_id")}),
+        Case("study_start", "/study/start", "POST", "/study/start"),
+        Case("study_pomodoro", "/study/<int:session_id>/pomodoro", "POST", "/study/{study_id}/pomodoro"),
+        Case("study_distraction", "/study/<int:session_id>/distraction", "POST", "/study/{study_id}/distraction"),
+        Case("study_complete", "/study/<int:session_id>/complete", "POST", "/study/{study_id}/complete"),
+        Case("study_history", "/study/history", "GET", "/study/history", read=True),
+        Case("study_task_post", "/study/task", "POST", "/study/task",
+             body=lambda c: {"task_name": "Bench", "estimated_time": 25}),
+        Case("study_task_put", "/study/task/<int:task_id>", "PUT", "/study/task/{task_id}",
+             body=lambda c: {"completed": True, "actual_time": 30}),
+        Case("study_task_delete", "/study/task/<int:task_id>", "DELETE", "/study/task/{task_id}",
+             setup=lambda client: {"task_id": client.post("/study/task", json={
+                 "task_name": "Bench", "estimated_time": 25
+             }).get_json()["task"]["id"]}),
+        Case("study_tasks", "/study/tasks", "GET", "/study/tasks", read=True),
+        Case("study_streak", "/study/streak", "GET", "/study/streak", read=True),
+        Case("focus_session", "/focus/session", "POST", "/focus/session",
+             body=lambda c: {"session_type": "breathing", "duration": 300}),
+        Case("focus_history", "/focus/history", "GET", "/focus/history", read=True),
+        Case("gratitude_post", "/gratitude", "POST", "/gratitude", body=lambda c: {"entry_text": "Bench", "date": TODAY}),
+        Case("gratitude_recent", "/gratitude/recent", "GET", "/gratitude/recent", read=True),
+        Case("mood_post", "/mood", "POST", "/mood", body=lambda c: {"mood_score": 4}),
+        Case("mood_recent", "/mood/recent", "GET", "/mood/recent", read=True),
+        Case("mood_average", "/mood/average", "GET", "/mood/average", read=True),
+        Case("journal_post", "/journal", "POST", "/journal", body=lambda c: {"entry_text": "Bench"}),
+        Case("journal_get", "/journal/<int:entry_id>", "GET", "/journal/{journal_id}", read=True),
+        Case("journal_delete", "/journal/<int:entry_id>", "DELETE", "/journal/{entry_id}",
+             setup=lambda client: {"entry_id": client.post("/journal", json={
+                 "entry_text": "Bench"
+             }).get_json()["entry"]["id"]}),
+        Case("journal_recent", "/journal/recent", "GET", "/journal/recent", read=True),
+        Case("stats_overview", "/stats/overview", "GET", "/stats/overview", read=True),
+        Case("sync", "/sync", "POST", "/sync", body=lambda c: {"events": [
+            {"type": "water", "idempotency_key": f"w{time.perf_counter_ns()}", "data": {"glasses": 7, "date": TODAY}},
+            {"type": "mood", "idempotency_key": f"m{time.perf_counter_ns()}", "data": {"mood_score": 3}},
+            {"type": "pomodoro", "idempotency_key": f"p{time.perf_counter_ns()}", "data": {"session_id": c["study_id"]}},
+        ]}),
+    ]
+
+
+def report_missing(cases: list[Case]) -> list[str]:
+    covered = {(case.rule, case.method) for case in cases}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == "static":
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (rule.rule, method) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
+
+
+def percentiles(samples: list[float]) -> dict:
+    if len(samples) < 2:
+        return {"p50": samples[0] if samples else None, "p95": None, "p99": None}
+    q = statistics.quantiles(samples, n=100)
+    return {"p50": round(q[49], 3), "p95": round(q[94], 3), "p99": round(q[98], 3)}
+
+
+def prepare_context(client, email: str) -> dict:
+    client.post("/login", json={"email": email, "password_hash": "x"})
+    return {
+        "email": email,
+        "workout_id": _post_id(client, "/workout/start", "session_id"),
+        "study_id": _post_id(client, "/study/start", "session_id"),
+        "reminder_id": _post_id(client, "/stretch/remind", "reminder_id"),
+        "task_id": client.post("/study/task", json={"task_name": "Bench", "estimated_time": 25}).get_json()["task"]["id"],
+        "journal_id": client.post("/journal", json={"entry_text": "Bench"}).get_json()["entry"]["id"],
+    }
+
+
+def run_test_client(cases: list[Case], email: str) -> dict:
+    querydebug.instrument_engine(engine, slow_query_ms=None)
+    results = {}
+
+    for case in cases:
+        client = app.test_client()
+        context = prepare_context(client, email)
+        started_all = time.perf_counter()
+        for _ in range(args.iterations):
+            values = dict(context)
+            if case.setup:
+                values.update(case.setup(client))
+            path = case.path.format(**values)
+            body = case.body(values) if case.body else None
+
+            with querydebug.track() as tracker:
+                started = time.perf_counter()
+                response = client.open(path, method=case.method, json=body, headers=OPS_HEADERS)
+                case.samples.append((time.perf_counter() - started) * 1000)
+            response.close()
+            case.queries.append(sum(tracker.counts.values()))
+            if response.status_code >= 400:
+                case.errors += 1
+
+            if case.setup:
+                # Odjava/brisanje su potrošili korisnika; vrati se na seed korisnika
+                client = app.test_client()
+                client.post("/login", json={"email": email, "password_hash": "x"})
+        wall = time.perf_counter() - started_all
+
+        results[case.name] = {
+            "method": case.method,
+            "path": case.path,
+            **percentiles(case.samples),
+            "mean": round(statistics.fmean(case.samples), 3),
+            "throughput_rps": round(len(case.samples) / sum(case.samples) * 1000, 1),
+            "wall_rps": round(len(case.samples) / wall, 1),
+            "queries_per_request": round(statistics.fmean(case.queries), 2),
+            "errors": case.errors,
+        }
+        print(f"  {case.name:<28} p50 {results[case.name]['p50']:>8.2f}ms  p99 {results[case.name]['p99'] or 0:>8.2f}ms"
+              f"  {results[case.name]['queries_per_request']:>5.1f} q/req  errors {case.errors}")
+    return results
+
+
+def run_http(cases: list[Case], email: str) -> dict:
+    client = app.test_client()
+    context = prepare_context(client, email)
+    paths = [case.path.format(**context) for case in cases if case.read]
+
+    process = subprocess.Popen(
+        load_test.server_command("gunicorn-gthread", args), cwd=os.path.dirname(BENCH_DIR),
+        env={**os.environ, "DATABASE_URL": args.url}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        load_test.wait_until_up(args.port)
+        cookie = load_test.login_cookie(args.port, email)
+        load_test.run_clients(args.port, cookie, args.concurrency, 1, paths)  # zagrevanje
+        total, errors, latencies = load_test.run_clients(args.port, cookie, args.concurrency, args.duration, paths)
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "model": "gunicorn-gthread",
+        "workers": args.workers,
+        "threads": args.threads,
+        "concurrency": args.concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / args.duration, 1),
+        **percentiles(latencies),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, path: str) -> None:
+    with open(path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {path} ({previous['meta'].get('commit')}):")
+    for name, now in results["routes"].items():
+        before = previous.get("routes", {}).get(name)
+        if not before or not before.get("p50") or not now.get("p50"):
+            continue
+        change = (now["p50"] - before["p50"]) / before["p50"] * 100
+        queries = now["queries_per_request"] - before["queries_per_request"]
+        print(f"  {name:<28} p50 {before['p50']:>8.2f} -> {now['p50']:>8.2f}ms ({change:+.0f}%)  queries {queries:+.1f}")
+
+
+def main():
+    init_db()
+    seeded = None
+    if not args.no_seed:
+        print(f"Seeding {args.users} users x {args.years} years...")
+        started = time.perf_counter()
+        seeded = seed.seed(args.users, args.years, args.seed)
+        seeded["seconds"] = round(time.perf_counter() - started, 1)
+        email = seed.email_for(seeded["first_user_id"])
+    else:
+        email = seed.email_for(1)
+
+    cases = catalog()
+    missing = report_missing(cases)
+    if missing:
+        print(f"Not in the benchmark catalog: {', '.join(missing)}")
+
+    print(f"Test client, {args.iterations} calls per route as {email}:")
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "users": args.users,
+            "years": args.years,
+            "seed": args.seed,
+            "iterations": args.iterations,
+        },
+        "seed": seeded,
+        "unbenchmarked_routes": missing,
+        "routes": run_test_client(cases, email),
+    }
+
+    if args.http:
+        print("HTTP load (gunicorn gthread, read routes)...")
+        results["http"] = run_http(cases, email)
+        print(f"  {results['http']['throughput_rps']} req/s, p50 {results['http']['p50']}ms, p99 {results['http']['p99']}ms")
+
+    out = args.out or os.path.join(BENCH_DIR, "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    return 0 if not any(r["errors"] for r in results["routes"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+from datetime import date
+from typing import Iterable, Optional
+
+from flask import Flask, g, jsonify
+from models import engine
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, func, update
+
+
+def get_db() -> Session:
+    """Return the request-scoped database session, opening it on first use."""
+    if "db_session" not in g:
+        g.db_session = Session(engine)
+    return g.db_session
+
+
+def upsert(
+    session: Session,
+    model,
+    values: dict,
+    index_elements: Iterable[str],
+    increment: Iterable[str] = (),
+    replace: Iterable[str] = (),
+):
+    """INSERT a row in one statement; on a key conflict add the `increment` columns and overwrite the `replace` ones.
+
+    MySQL gets INSERT ... ON DUPLICATE KEY UPDATE, SQLite (local runs) INSERT ... ON CONFLICT.
+    """
+    table = model.__table__
+    index_elements = list(index_elements)
+
+    if session.get_bind().dialect.name == "mysql":
+        stmt = mysql_insert(table).values(**values)
+        updates = {col: table.c[col] + stmt.inserted[col] for col in increment}
+        updates.update({col: stmt.inserted[col] for col in replace})
+        # MySQL nema DO NOTHING, pa "ažuriramo" ključ na istu vrednost
+        stmt = stmt.on_duplicate_key_update(**(updates or {index_elements[0]: table.c[index_elements[0]]}))
+    else:
+        stmt = sqlite_insert(table).values(**values)
+        updates = {col: table.c[col] + stmt.excluded[col] for col in increment}
+        updates.update({col: stmt.excluded[col] for col in replace})
+        if updates:
+            stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=updates)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+    return session.execute(stmt)
+
+
+def add_to_owned(session: Session, model, row_id: int, user_id: int, **amounts) -> bool:
+    """Atomically add `amounts` to the user's row in one UPDATE; False if the row doesn't exist or isn't theirs."""
+    table = model.__table__
+    result = session.execute(
+        update(table)
+        .where(table.c.id == row_id, table.c.user_id == user_id)
+        .values({column: table.c[column] + amount for column, amount in amounts.items()})
+    )
+    return result.rowcount > 0
+
+
+def increment_counter(session: Session, model, row_id: int, user_id: int, column: str) -> Optional[int]:
+    """Atomically add 1 to an integer column of the user's row and return the new value (None if not found).
+
+    One round trip: UPDATE ... RETURNING where supported, otherwise MySQL's
+    LAST_INSERT_ID(expr), whose value comes back in the UPDATE's OK packet.
+    """
+    table = model.__table__
+    stmt = update(table).where(table.c.id == row_id, table.c.user_id == user_id)
+
+    if session.get_bind().dialect.update_returning:
+        return session.execute(
+            stmt.values({column: table.c[column] + 1}).returning(table.c[column])
+        ).scalar_one_or_none()
+
+    result = session.execute(stmt.values({column: func.last_insert_id(table.c[column] + 1)}))
+    if result.rowcount == 0:
+        return None
+    return result.lastrowid
+
+
+# TO_DAYS() dana ide u gornje bitove LAST_INSERT_ID, brojač u donjih 20
+_DAY_SHIFT = 1 << 20
+
+
+def increment_counter_dated(
+    session: Session, model, row_id: int, user_id: int, column: str, date_column: str
+) -> Optional[tuple[int, date]]:
+    """Like increment_counter, but also return the date of the row's `date_column`, still in one round trip.
+
+    MySQL has no RETURNING, so the day number and the new count are packed into the
+    single LAST_INSERT_ID value and split again here.
+    """
+    table = model.__table__
+    stmt = update(table).where(table.c.id == row_id, table.c.user_id == user_id)
+
+    if session.get_bind().dialect.update_returning:
+        row = session.execute(
+            stmt.values({column: table.c[column] + 1}).returning(table.c[column], table.c[date_column])
+        ).first()
+        return (row[0], row[1].date()) if row else None
+
+    offset = func.to_days(table.c[date_column]) * _DAY_SHIFT
+    result = session.execute(stmt.values({column: func.last_insert_id(table.c[column] + 1 + offset) - offset}))
+    if result.rowcount == 0:
+        return None
+    days, count = divmod(result.lastrowid, _DAY_SHIFT)
+    # TO_DAYS('0001-01-01') je 366, date.fromordinal(1) je isti dan
+    return count, date.fromordinal(days - 365)
+
+
+def init_app(app: Flask) -> None:
+    """Commit the request session on success, roll it back on errors and always close it."""
+
+    @app.after_request
+    def finish_db_session(response):
+        session = g.get("db_session")
+        if session is None:
+            return response
+
+        if response.status_code >= 400:
+            session.rollback()
+            return response
+
+        try:
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            # after_request mora da vrati Response (ne tuple), jer ga dalje obrađuju ostali hook-ovi
+            error = jsonify({"error": str(e)})
+            error.status_code = 500
+            return error
+
+        return response
+
+    @app.teardown_request
+    def close_db_session(exc):
+        session = g.pop("db_session", None)
+        if session is None:
+            return
+
+        if exc is not None:
+            session.rollback()
+        session.close()
@@ -0,0 +1,110 @@
+"""
+Streaming per-user data export (GET /account/export).
+
+Rows are read with server-side cursors (yield_per -> stream_results, SSCursor on
+MySQL) and serialized one at a time, so memory stays flat however long the history is.
+"""
+import json
+import os
+from datetime import date, datetime
+from typing import Iterator
+
+from models import (
+    Exercise,
+    FocusSession,
+    GratitudeEntry,
+    MoodCheckin,
+    OnboardingData,
+    StressJournal,
+    StretchReminder,
+    StudySession,
+    StudyStreak,
+    StudyTask,
+    WaterIntake,
+    WorkoutSession,
+    engine,
+)
+from sqlmodel import select
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Sve tabele sa podacima korisnika; vežbe nemaju user_id pa idu preko treninga
+EXPORT_TABLES = [
+    ("workout_sessions", WorkoutSession, None),
+    ("exercises", Exercise, WorkoutSession),
+    ("water_intake", WaterIntake, None),
+    ("stretch_reminders", StretchReminder, None),
+    ("study_sessions", StudySession, None),
+    ("study_tasks", StudyTask, None),
+    ("study_streaks", StudyStreak, None),
+    ("focus_sessions", FocusSession, None),
+    ("gratitude_entries", GratitudeEntry, None),
+    ("mood_checkins", MoodCheckin, None),
+    ("stress_journal", StressJournal, None),
+    ("onboarding_data", OnboardingData, None),
+]
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> str:
+    return json.dumps(value, default=_default, ensure_ascii=False)
+
+
+def _query(model, parent, user_id: int):
+    table = model.__table__
+    if parent is None:
+        return select(table).where(table.c.user_id == user_id).order_by(table.c.id)
+    return (
+        select(table)
+        .join(parent, table.c.session_id == parent.id)
+        .where(parent.user_id == user_id)
+        .order_by(table.c.id)
+    )
+
+
+def iter_tables(user_id: int, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[tuple[str, Iterator[dict]]]:
+    """Yield (table name, row iterator) per table; each iterator must be consumed before the next one."""
+    # Sopstvena konekcija: request sesija ostaje otvorena do teardown_request (posle generatora),
+    # ali je njena transakcija već commit-ovana u after_request, a SSCursor drži konekciju dok se ne istoči
+    with engine.connect() as conn:
+        conn = conn.execution_options(yield_per=batch_size)
+        for name, model, parent in EXPORT_TABLES:
+            with conn.execute(_query(model, parent, user_id)) as result:
+                yield name, (dict(row) for row in result.mappings())
+
+
+def ndjson(user: dict, user_id: int) -> Iterator[str]:
+    """One JSON object per line: the account first, then {"table": ..., "row": ...} for each row."""
+    yield dumps({"table": "users", "row": user}) + "\n"
+    for name, rows in iter_tables(user_id):
+        for row in rows:
+            yield dumps({"table": name, "row": row}) + "\n"
+
+
+def json_document(user: dict, user_id: int) -> Iterator[str]:
+    """A single {"user": ..., "<table>": [...], ...} document, written piece by piece."""
+    yield '{"user": ' + dumps(user)
+    for name, rows in iter_tables(user_id):
+        yield f', "{name}": ['
+        for i, row in enumerate(rows):
+            yield (", " if i else "") + dumps(row)
+        yield "]"
+    yield "}\n"
+
+
+def buffered(pieces: Iterator[str], size: int = 64 * 1024) -> Iterator[str]:
+    """Join small pieces into ~`size` chunks so the server isn't writing one socket send per row."""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,40 @@
+"""
+Gunicorn settings for the API (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Worker model: `workers` processes x `threads` threads each (gthread). Every request
+runs on a thread and blocks on PyMySQL, which releases the GIL while it waits on the
+socket, so one process serves `threads` requests concurrently. Each worker has its own
+SQLAlchemy pool, so keep threads <= DB_POOL_SIZE + DB_MAX_OVERFLOW, and the total
+(workers x that) under MySQL's max_connections.
+
+The app is imported separately in every worker (no preload). The tables are created once
+here in the master before any worker starts, and the master's pool is disposed right after,
+so forked workers start with no connection to share.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5050")
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = 30
+keepalive = 5  # nginx drži konekcije otvorenim
+
+# Recikliranje radnika ograničava curenje memorije
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    from models import engine, init_db
+
+    init_db()
+    # Radnici nasleđuju modul models preko fork-a; pul mastera ne sme da im ostavi otvorenu konekciju
+    engine.dispose()
+    os.environ["SKIP_INIT_DB"] = "1"
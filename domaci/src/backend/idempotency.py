@@ -0,0 +1,168 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A retried POST carrying the same Idempotency-Key header gets the original response
+replayed from the store instead of creating a duplicate row. Keys are scoped to the
+user, method and path, and the request body is fingerprinted so a reused key with a
+different payload is rejected (422). The store is in-process by default; set
+IDEMPOTENCY_REDIS_URL to share it between workers.
+"""
+import hashlib
+import json
+import os
+from functools import wraps
+from typing import NamedTuple, Optional
+
+from cache import TTLCache
+from flask import Flask, Response, g, jsonify, request
+
+MAX_KEY_LENGTH = 255
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Koliko dugo važi oznaka "u toku": ako radnik padne između claim i save, ključ se oslobađa posle ovoliko
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", "120"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+
+class StoredResponse(NamedTuple):
+    """A finished response, or an in-flight marker while status is None."""
+    fingerprint: str
+    status: Optional[int] = None
+    body: bytes = b""
+    mimetype: str = "application/json"
+
+
+class MemoryStore:
+    """Per-process store on top of TTLCache (LRU + TTL eviction)."""
+
+    def __init__(
+        self,
+        maxsize: int = IDEMPOTENCY_CACHE_SIZE,
+        ttl: float = IDEMPOTENCY_TTL,
+        lock_ttl: float = IDEMPOTENCY_LOCK_TTL,
+    ):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock_ttl = lock_ttl
+
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Mark the key as in flight (for lock_ttl) and return None, or return what is already stored under it."""
+        return self.cache.add(key, StoredResponse(fingerprint), ttl=self.lock_ttl)
+
+    def save(self, key: str, response: StoredResponse) -> None:
+        self.cache.set(key, response)
+
+    def release(self, key: str) -> None:
+        self.cache.pop(key)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "lock_ttl": self.lock_ttl, **self.cache.stats()}
+
+
+class RedisStore:
+    """Store shared by all workers (SET NX for the in-flight claim, EX for the TTL)."""
+
+    def __init__(self, url: str, ttl: int = IDEMPOTENCY_TTL, lock_ttl: int = IDEMPOTENCY_LOCK_TTL, prefix: str = "idem:"):
+        import redis  # opciona zavisnost, potrebna samo uz IDEMPOTENCY_REDIS_URL
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+
+    @staticmethod
+    def _dump(response: StoredResponse) -> str:
+        return json.dumps([response.fingerprint, response.status, response.body.decode(), response.mimetype])
+
+    @staticmethod
+    def _load(raw: bytes) -> StoredResponse:
+        fingerprint, status, body, mimetype = json.loads(raw)
+        return StoredResponse(fingerprint, status, body.encode(), mimetype)
+
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        if self.client.set(self.prefix + key, self._dump(StoredResponse(fingerprint)), nx=True, ex=self.lock_ttl):
+            return None
+        raw = self.client.get(self.prefix + key)
+        # Ključ je istekao između SET NX i GET; tretiramo ga kao da je još u toku
+        return self._load(raw) if raw else StoredResponse(fingerprint)
+
+    def save(self, key: str, response: StoredResponse) -> None:
+        self.client.set(self.prefix + key, self._dump(response), ex=self.ttl)
+
+    def release(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "ttl": self.ttl, "lock_ttl": self.lock_ttl}
+
+
+def _default_store():
+    url = os.getenv("IDEMPOTENCY_REDIS_URL")
+    return RedisStore(url) if url else MemoryStore()
+
+
+store = _default_store()
+
+
+def set_store(new_store) -> None:
+    """Swap the backend (anything with claim/save/release/stats)."""
+    global store
+    store = new_store
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key; put it under @require_user."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view(*args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        store_key = f"{g.user.id}:{request.method}:{request.path}:{key}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()[:32]
+
+        existing = store.claim(store_key, fingerprint)
+        if existing is not None:
+            if existing.fingerprint != fingerprint:
+                return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+            if existing.status is None:
+                return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+            response = Response(existing.body, status=existing.status, mimetype=existing.mimetype)
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        g.idempotency_claim = (store_key, fingerprint)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def init_app(app: Flask) -> None:
+    """Save or release claims once the response is final.
+
+    Register it before db.init_app: after_request hooks run in reverse order, so this
+    one sees the response after the commit (a failed commit turns it into a 500).
+    """
+
+    @app.after_request
+    def save_idempotent_response(response):
+        claim = g.pop("idempotency_claim", None)
+        if claim is None:
+            return response
+
+        store_key, fingerprint = claim
+        if 200 <= response.status_code < 300:
+            store.save(store_key, StoredResponse(fingerprint, response.status_code, response.get_data(), response.mimetype))
+        else:
+            # Greške se ne pamte, klijent sme da pokuša ponovo
+            store.release(store_key)
+        return response
+
+    @app.teardown_request
+    def release_idempotency_claim(exc):
+        claim = g.pop("idempotency_claim", None)
+        if claim is not None:
+            store.release(claim[0])
@@ -0,0 +1,189 @@
+"""
+Per-endpoint request instrumentation, exposed in Prometheus text format at /metrics.
+
+Flask hooks time each request; SQLAlchemy cursor events on the engine add up DB time,
+query count and rows (as reported by the driver's rowcount) for the request being
+served. Everything lives in in-process histograms, so with several gunicorn workers
+each scrape sees the worker that answered it.
+
+In development every response also gets a Server-Timing header (browser devtools show it).
+/metrics itself is off unless OPS_TOKEN is set (see ops.py).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Flask, Response, g, has_request_context, request
+from ops import require_ops_token
+from pool import pool_stats
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, like prometheus_client's, without the dependency."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self, label_names: tuple) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+
+        for labels, series in sorted(snapshot.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, label_names: tuple) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_labels(label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+ROUTE_LABELS = ("route", "method")
+
+request_duration = Histogram("hzs_request_duration_seconds", "Wall time per request.", TIME_BUCKETS)
+db_duration = Histogram("hzs_request_db_seconds", "Time spent executing SQL per request.", TIME_BUCKETS)
+query_count = Histogram("hzs_request_queries", "SQL statements executed per request.", COUNT_BUCKETS)
+rows_total = Counter("hzs_request_db_rows_total", "Rows returned or affected, as reported by the driver.")
+requests_total = Counter("hzs_requests_total", "Requests by route, method and status.")
+
+
+def _route() -> tuple:
+    # Šablon rute (npr. /workout/<int:session_id>/exercise), ne konkretan URL, da labela ne bi eksplodirala
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    return rule, request.method
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Accumulate DB time, query count and rows on flask.g for statements run inside a request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        if not has_request_context() or "metrics_start" not in g:
+            return
+        g.db_time += elapsed
+        g.db_queries += 1
+        if cursor.rowcount and cursor.rowcount > 0:
+            g.db_rows += cursor.rowcount
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        # Neuspeli upit nema after_cursor_execute; bez ovoga bi njegov start ostao na konekciji iz pula
+        stack = context.connection.info.get("query_start") if context.connection else None
+        if stack:
+            stack.pop()
+
+
+def render() -> str:
+    lines = []
+    lines += request_duration.render(ROUTE_LABELS)
+    lines += db_duration.render(ROUTE_LABELS)
+    lines += query_count.render(ROUTE_LABELS)
+    lines += rows_total.render(ROUTE_LABELS)
+    lines += requests_total.render(ROUTE_LABELS + ("status",))
+    return "\n".join(lines) + "\n"
+
+
+def render_pool(engine: Engine) -> str:
+    lines = []
+    for key, value in pool_stats(engine).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE hzs_db_pool_{key} gauge")
+            lines.append(f"hzs_db_pool_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app: Flask, engine: Engine) -> None:
+    """Time every request and serve /metrics.
+
+    Register it before db.init_app: after_request hooks run in reverse order, so the
+    commit is included in the request's wall and DB time.
+    """
+    instrument_engine(engine)
+    server_timing = os.getenv("ENV") == "development"
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+        g.db_time = 0.0
+        g.db_queries = 0
+        g.db_rows = 0
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+
+        elapsed = time.perf_counter() - start
+        labels = _route()
+        request_duration.observe(labels, elapsed)
+        db_duration.observe(labels, g.db_time)
+        query_count.observe(labels, g.db_queries)
+        rows_total.inc(labels, g.db_rows)
+        requests_total.inc(labels + (response.status_code,))
+
+        if server_timing:
+            response.headers["Server-Timing"] = (
+                f'app;dur={elapsed * 1000:.2f}, '
+                f'db;dur={g.db_time * 1000:.2f};desc="{g.db_queries} queries, {g.db_rows} rows"'
+            )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    @require_ops_token
+    def prometheus_metrics():
+        return Response(render() + render_pool(engine), mimetype="text/plain; version=0.0.4")
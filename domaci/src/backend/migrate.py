@@ -0,0 +1,135 @@
+"""
+Schema migrations for existing deployments.
+
+init_db() only creates missing tables; it never touches tables that already exist.
+Every step below is idempotent, so it is safe to run on each deploy:
+
+    python migrate.py [--drop-redundant]
+"""
+import argparse
+from datetime import datetime
+
+import tokens
+from models import LegacySessionDB, SessionDB, engine, init_db
+from sqlalchemy import Connection, Index, UniqueConstraint, delete, insert, inspect, select, text
+from sqlmodel import SQLModel
+
+
+def _existing_index_names(conn: Connection, table: str) -> set[str]:
+    inspector = inspect(conn)
+    names = {ix["name"] for ix in inspector.get_indexes(table)}
+    names |= {uc["name"] for uc in inspector.get_unique_constraints(table)}
+    return names
+
+
+def dedupe_water_intake(conn: Connection) -> None:
+    """Keep only the most recent row per (user_id, date) so the unique key can be added."""
+    conn.execute(text(
+        "DELETE FROM water_intake WHERE id NOT IN ("
+        " SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM water_intake GROUP BY user_id, date) AS keep"
+        ")"
+    ))
+
+
+def expire_logged_out_sessions(conn: Connection) -> None:
+    """Logout now also sets expires_at; do the same for older logged-out rows so session_gc sweeps them."""
+    conn.execute(text("UPDATE sessions SET expires_at = created_at WHERE is_valid = false AND expires_at > created_at"))
+
+
+def move_legacy_sessions(conn: Connection, batch_size: int = 1000) -> int:
+    """Copy live UUID-string sessions into auth_sessions (BINARY(16) ids) and empty the old table.
+
+    Old cookies keep working: tokens.decode() maps the UUID string to the same 16 bytes.
+    """
+    legacy = LegacySessionDB.__table__
+    moved = 0
+    while True:
+        rows = conn.execute(
+            select(legacy).where(legacy.c.expires_at >= datetime.now()).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+
+        values = []
+        for row in rows:
+            token = tokens.decode(row["session_uuid"], check_expiry=False)
+            if token is not None:
+                values.append({
+                    "id": token.session_id,
+                    "user_id": row["user_id"],
+                    "created_at": row["created_at"],
+                    "expires_at": row["expires_at"],
+                    "is_valid": row["is_valid"],
+                })
+        if values:
+            conn.execute(insert(SessionDB.__table__), values)
+        conn.execute(delete(legacy).where(legacy.c.session_uuid.in_([row["session_uuid"] for row in rows])))
+        moved += len(values)
+
+    # Istekle se ne prenose
+    conn.execute(delete(legacy))
+    return moved
+
+
+def add_sync_event_fingerprint(conn: Connection) -> None:
+    """Add sync_events.fingerprint; older rows keep "" and are replayed without the payload check."""
+    columns = {column["name"] for column in inspect(conn).get_columns("sync_events")}
+    if "fingerprint" not in columns:
+        conn.execute(text("ALTER TABLE sync_events ADD COLUMN fingerprint VARCHAR(32) NOT NULL DEFAULT ''"))
+
+
+def add_composite_indexes(conn: Connection, drop_redundant: bool = False) -> None:
+    """Create the (user_id, <time column>) indexes and unique keys declared in models.py."""
+    for table in SQLModel.metadata.sorted_tables:
+        existing = _existing_index_names(conn, table.name)
+
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"  + {table.name}.{index.name}")
+                index.create(conn)
+
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in existing:
+                print(f"  + {table.name}.{constraint.name} (unique)")
+                Index(constraint.name, *constraint.columns, unique=True).create(conn)
+
+        if drop_redundant and conn.dialect.name == "mysql":
+            # MySQL-ov automatski FK indeks na user_id je višak kad postoji (user_id, ...) indeks
+            has_composite = any(
+                len(ix.columns) > 1 and list(ix.columns)[0].name == "user_id"
+                for ix in table.indexes
+            ) or any(
+                isinstance(c, UniqueConstraint) and len(c.columns) > 1 and list(c.columns)[0].name == "user_id"
+                for c in table.constraints
+            )
+            if has_composite and "user_id" in existing:
+                print(f"  - {table.name}.user_id")
+                conn.execute(text(f"ALTER TABLE `{table.name}` DROP INDEX `user_id`"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument(
+        "--drop-redundant",
+        action="store_true",
+        help="drop single-column user_id indexes made redundant by the composite ones (MySQL)",
+    )
+    args = parser.parse_args()
+
+    init_db()
+    with engine.begin() as conn:
+        print("water_intake: removing duplicate (user_id, date) rows")
+        dedupe_water_intake(conn)
+        print("sessions: expiring logged-out sessions")
+        expire_logged_out_sessions(conn)
+        print("sessions: moving UUID-string sessions to auth_sessions")
+        print(f"  moved {move_legacy_sessions(conn)}")
+        print("sync_events: adding the payload fingerprint column")
+        add_sync_event_fingerprint(conn)
+        print("Composite indexes:")
+        add_composite_indexes(conn, drop_redundant=args.drop_redundant)
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,47 @@ from datetime import date, datetime
 from typing import Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import JSON, TEXT
+from pool import TimedQueuePool
+from sqlalchemy import BINARY, JSON, TEXT, Index, UniqueConstraint, text
 from sqlmodel import Column, Field, SQLModel, create_engine
 
 load_dotenv()
 
-DATABASE_URL = f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
 
-engine = create_engine(DATABASE_URL, echo=False)
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+def engine_options(url: str) -> dict:
+    """Build create_engine() keyword arguments from the DB_* environment variables."""
+    options: dict = {"echo": False}
+    if url.startswith("sqlite"):
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),  # MySQL wait_timeout je obično 8h
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING", "true"),
+        connect_args={
+            "connect_timeout": int(os.getenv("DB_TIMEOUT", "5")),
+            "read_timeout": int(os.getenv("DB_READ_TIMEOUT", "30")),
+            "write_timeout": int(os.getenv("DB_WRITE_TIMEOUT", "30")),
+        },
+    )
+
+    isolation_level = os.getenv("DB_ISOLATION_LEVEL")
+    if isolation_level:
+        options["isolation_level"] = isolation_level
+
+    return options
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 class User(SQLModel, table=True):
     __tablename__ = "users" # type: ignore
@@ -23,6 +56,21 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.now)
 
 class SessionDB(SQLModel, table=True):
+    """Login session keyed by a 16-byte random id; the cookie is a token wrapping it (see tokens.py)."""
+    __tablename__ = "auth_sessions" # type: ignore
+    __table_args__ = (
+        Index("ix_auth_sessions_expires", "expires_at"),
+        Index("ix_auth_sessions_user_created", "user_id", "created_at"),
+    )
+
+    id: bytes = Field(sa_column=Column(BINARY(16), primary_key=True))
+    user_id: int = Field(foreign_key="users.id")
+    created_at: datetime = Field(default_factory=datetime.now)
+    expires_at: datetime
+    is_valid: bool = Field(default=True)
+
+class LegacySessionDB(SQLModel, table=True):
+    """Pre-token sessions keyed by UUID strings; migrate.py moves them into auth_sessions."""
     __tablename__ = "sessions" # type: ignore
 
     session_uuid: str = Field(primary_key=True, max_length=255)
@@ -46,6 +94,7 @@ class OnboardingData(SQLModel, table=True):
 
 class WorkoutSession(SQLModel, table=True):
     __tablename__ = "workout_sessions" # type: ignore
+    __table_args__ = (Index("ix_workout_sessions_user_start", "user_id", "start_time"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -67,6 +116,7 @@ class Exercise(SQLModel, table=True):
 
 class WaterIntake(SQLModel, table=True):
     __tablename__ = "water_intake" # type: ignore
+    __table_args__ = (UniqueConstraint("user_id", "date", name="uq_water_intake_user_date"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -85,6 +135,7 @@ class StretchReminder(SQLModel, table=True):
 
 class StudySession(SQLModel, table=True):
     __tablename__ = "study_sessions" # type: ignore
+    __table_args__ = (Index("ix_study_sessions_user_start", "user_id", "start_time"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -96,6 +147,7 @@ class StudySession(SQLModel, table=True):
 
 class StudyTask(SQLModel, table=True):
     __tablename__ = "study_tasks" # type: ignore
+    __table_args__ = (Index("ix_study_tasks_user_created", "user_id", "created_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -118,6 +170,7 @@ class StudyStreak(SQLModel, table=True):
 
 class FocusSession(SQLModel, table=True):
     __tablename__ = "focus_sessions" # type: ignore
+    __table_args__ = (Index("ix_focus_sessions_user_completed", "user_id", "completed_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -129,6 +182,7 @@ class FocusSession(SQLModel, table=True):
 
 class GratitudeEntry(SQLModel, table=True):
     __tablename__ = "gratitude_entries" # type: ignore
+    __table_args__ = (Index("ix_gratitude_entries_user_date", "user_id", "date"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -138,6 +192,7 @@ class GratitudeEntry(SQLModel, table=True):
 
 class MoodCheckin(SQLModel, table=True):
     __tablename__ = "mood_checkins" # type: ignore
+    __table_args__ = (Index("ix_mood_checkins_user_created", "user_id", "created_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
@@ -148,12 +203,77 @@ class MoodCheckin(SQLModel, table=True):
 
 class StressJournal(SQLModel, table=True):
     __tablename__ = "stress_journal" # type: ignore
+    __table_args__ = (Index("ix_stress_journal_user_created", "user_id", "created_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.id")
     entry_text: str = Field(sa_column=Column(TEXT))
     created_at: datetime = Field(default_factory=datetime.now)
 
+class UserDailyStats(SQLModel, table=True):
+    """Per-user, per-day rollup kept current by the write paths (see rollup.py)."""
+    __tablename__ = "user_daily_stats" # type: ignore
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    workouts: int = Field(default=0)
+    calories_burned: float = Field(default=0.0)
+    study_seconds: int = Field(default=0)
+    pomodoros: int = Field(default=0)
+    focus_sessions: int = Field(default=0)
+    mood_sum: int = Field(default=0)
+    mood_count: int = Field(default=0)
+    water_glasses: int = Field(default=0)
+
+class UserVersion(SQLModel, table=True):
+    """Per-user change counters behind the ETags of the read endpoints (see etag.py)."""
+    __tablename__ = "user_versions" # type: ignore
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    onboarding: int = Field(default=0)
+    study_streak: int = Field(default=0)
+    water: int = Field(default=0)
+
+class SyncEvent(SQLModel, table=True):
+    """Result of an event applied through /sync, keyed by the client's idempotency key so retries replay it."""
+    __tablename__ = "sync_events" # type: ignore
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_sync_events_user_key"),
+        Index("ix_sync_events_created", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    idempotency_key: str = Field(max_length=64)
+    event_type: str = Field(max_length=32)
+    # sha256 (type, data, occurred_at) da se isti ključ sa drugim sadržajem odbije; "" za stare redove
+    fingerprint: str = Field(default="", max_length=32)
+    status: int
+    response: dict = Field(sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class AccountDeletion(SQLModel, table=True):
+    """Account whose data is still being purged in the background (see account.py)."""
+    __tablename__ = "account_deletions" # type: ignore
+
+    user_id: int = Field(primary_key=True)
+    requested_at: datetime = Field(default_factory=datetime.now)
+
 def init_db():
-    """Create all tables in the database"""
-    SQLModel.metadata.create_all(engine)
+    """Create all tables in the database.
+
+    Several workers may start at once, so on MySQL the CREATE TABLEs run under a named
+    lock (GET_LOCK); whoever waits then finds the tables already there.
+    """
+    if engine.dialect.name != "mysql":
+        SQLModel.metadata.create_all(engine)
+        return
+
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT GET_LOCK('hzs_init_db', 30)")).scalar():
+            raise RuntimeError("Timed out waiting for the init_db lock")
+        try:
+            SQLModel.metadata.create_all(conn)
+            conn.commit()
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK('hzs_init_db')"))
@@ -0,0 +1,31 @@
+"""
+Access control for the operational endpoints (/metrics, /health/cache, /health/sessions).
+
+They expose per-route latency, pool state, cache sizes and session counts, so they are
+off by default (404). Set OPS_TOKEN to enable them; callers (Prometheus, dashboards)
+then send `Authorization: Bearer <OPS_TOKEN>`.
+"""
+import hmac
+import os
+from functools import wraps
+
+from flask import jsonify, request
+
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")
+
+
+def require_ops_token(view):
+    """404 while OPS_TOKEN is unset, 401 without the matching bearer token."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not OPS_TOKEN:
+            return jsonify({"error": "Not found"}), 404
+
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), OPS_TOKEN.encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+
+        return view(*args, **kwargs)
+
+    return wrapper
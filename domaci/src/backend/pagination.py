@@ -0,0 +1,63 @@
+"""
+Keyset (cursor) pagination for history endpoints.
+
+Pages are ordered by (timestamp DESC, id DESC) and the cursor encodes the last row's
+(timestamp, id), so page N costs the same index range scan as page 1 (no OFFSET).
+"""
+import base64
+from typing import Any, Callable, Optional, Sequence
+
+from flask import request
+from sqlalchemy import and_, or_
+from sqlmodel import desc
+
+MAX_LIMIT = 100
+
+
+def encode_cursor(timestamp, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, time_column) -> tuple[Any, int]:
+    """Decode a cursor into (timestamp, id); raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return time_column.type.python_type.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def page_args(time_column, default_limit: int = 20) -> tuple[int, Optional[tuple[Any, int]]]:
+    """Read ?limit= and ?cursor= from the request; raises ValueError on bad input."""
+    limit = request.args.get("limit", default_limit, type=int)
+    if not (1 <= limit <= MAX_LIMIT):
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    return limit, cursor_arg(time_column)
+
+
+def cursor_arg(time_column, name: str = "cursor") -> Optional[tuple[Any, int]]:
+    """Read one cursor query parameter (for endpoints that page several lists); raises ValueError if malformed."""
+    cursor = request.args.get(name)
+    return decode_cursor(cursor, time_column) if cursor else None
+
+
+def keyset(query, time_column, id_column, limit: int, cursor: Optional[tuple[Any, int]]):
+    """Restrict the query to rows after the cursor, newest first; fetches one extra row to detect a next page."""
+    if cursor:
+        timestamp, row_id = cursor
+        query = query.where(or_(
+            time_column < timestamp,
+            and_(time_column == timestamp, id_column < row_id)
+        ))
+    return query.order_by(desc(time_column), desc(id_column)).limit(limit + 1)
+
+
+def split_page(rows: Sequence, limit: int, key: Callable) -> tuple[Sequence, Optional[str]]:
+    """Trim the look-ahead row and return (page, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(*key(page[-1]))
@@ -0,0 +1,148 @@
+"""
+Slow-query log and N+1 detector for development and staging (SQL_DEBUG=1).
+
+Every statement slower than SLOW_QUERY_MS is logged with its route and parameters, and
+a request that runs the same normalized SQL more than N_PLUS_ONE_THRESHOLD times is
+flagged. With SQL_DEBUG_RAISE=1 the offending statement raises NPlusOneError once it
+has run, which the handlers turn into a 500, so a regression can't slip through unnoticed.
+
+The same detector works in tests without any env:
+
+    with querydebug.track(threshold=3) as tracker:
+        response = client.get("/workout/history?include=exercises")
+    tracker.assert_no_n_plus_one()
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENABLED = os.getenv("SQL_DEBUG", "").lower() in ("1", "true", "yes", "on")
+RAISE = os.getenv("SQL_DEBUG_RAISE", "").lower() in ("1", "true", "yes", "on")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+logger = logging.getLogger("hzs.sql")
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+def normalize(statement: str) -> str:
+    """Collapse whitespace, literals and IN (...) lists so repeats of one query compare equal."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _IN_LIST.sub("(?)", statement)
+    return _LITERAL.sub("?", statement)
+
+
+class QueryTracker:
+    """Counts normalized statements; flags any that runs more than `threshold` times."""
+
+    def __init__(self, threshold: int = N_PLUS_ONE_THRESHOLD, raise_on_detect: bool = False):
+        self.threshold = threshold
+        self.raise_on_detect = raise_on_detect
+        self.counts: Counter = Counter()
+
+    def record(self, statement: str) -> None:
+        key = normalize(statement)
+        self.counts[key] += 1
+        if self.raise_on_detect and self.counts[key] == self.threshold + 1:
+            raise NPlusOneError(f"N+1 query: ran {self.counts[key]} times: {key}")
+
+    @property
+    def repeated(self) -> dict[str, int]:
+        return {sql: count for sql, count in self.counts.items() if count > self.threshold}
+
+    def assert_no_n_plus_one(self) -> None:
+        if self.repeated:
+            details = "; ".join(f"{count}x {sql}" for sql, count in self.repeated.items())
+            raise AssertionError(f"N+1 queries detected: {details}")
+
+
+# Aktivni trackeri po niti (zahtev i/ili test mogu biti ugnježdeni)
+_local = threading.local()
+
+
+def _active() -> list:
+    if not hasattr(_local, "trackers"):
+        _local.trackers = []
+    return _local.trackers
+
+
+@contextmanager
+def track(threshold: int = N_PLUS_ONE_THRESHOLD, raise_on_detect: bool = False) -> Iterator[QueryTracker]:
+    """Record every statement run by this thread inside the block."""
+    tracker = QueryTracker(threshold, raise_on_detect)
+    _active().append(tracker)
+    try:
+        yield tracker
+    finally:
+        _active().remove(tracker)
+
+
+_instrumented: set = set()
+
+
+def instrument_engine(engine: Engine, slow_query_ms: Optional[float] = SLOW_QUERY_MS) -> None:
+    """Feed active trackers and (if slow_query_ms is set) log slow statements. Safe to call twice."""
+    if id(engine) in _instrumented:
+        return
+    _instrumented.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("debug_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["debug_query_start"].pop()) * 1000
+        if slow_query_ms is not None and elapsed_ms >= slow_query_ms:
+            route = f"{request.method} {request.path}" if has_request_context() else "-"
+            logger.warning(
+                "Slow query (%.1f ms) on %s: %s | params=%.500r",
+                elapsed_ms, route, _WHITESPACE.sub(" ", statement), parameters,
+            )
+        # Brojimo tek posle izvršenja: NPlusOneError iz before_cursor_execute ne prolazi kroz
+        # handle_error, pa bi start iz metrics.py ostao na konekciji
+        for tracker in _active():
+            tracker.record(statement)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        # Neuspeli upit nema after_cursor_execute; skidamo njegov start
+        stack = context.connection.info.get("debug_query_start") if context.connection else None
+        if stack:
+            stack.pop()
+
+
+def init_app(app: Flask, engine: Engine) -> None:
+    """Track each request and log N+1 patterns when it finishes."""
+    instrument_engine(engine)
+
+    @app.before_request
+    def start_query_tracking():
+        g.query_tracker = QueryTracker(N_PLUS_ONE_THRESHOLD, raise_on_detect=RAISE)
+        _active().append(g.query_tracker)
+
+    @app.teardown_request
+    def finish_query_tracking(exc):
+        tracker = g.pop("query_tracker", None)
+        if tracker is None:
+            return
+        if tracker in _active():
+            _active().remove(tracker)
+        for sql, count in tracker.repeated.items():
+            logger.warning("N+1 on %s %s: %d x %s", request.method, request.path, count, sql)
@@ -0,0 +1,115 @@
+"""
+Per-user daily rollup (user_daily_stats).
+
+The write paths call bump() / set_water() in the same transaction as the raw insert,
+so the dashboard and weekly endpoints read O(days) rows instead of rescanning the
+event tables. Rebuild it from the raw tables with:
+
+    python rollup.py backfill [--user USER_ID]
+"""
+import argparse
+from datetime import date
+from typing import Optional
+
+from db import upsert
+from models import (
+    Exercise,
+    FocusSession,
+    MoodCheckin,
+    StudySession,
+    UserDailyStats,
+    WaterIntake,
+    WorkoutSession,
+    engine,
+    init_db,
+)
+from sqlmodel import Session, delete, func, insert, select
+
+KEY = ("user_id", "day")
+
+
+def bump(session: Session, user_id: int, day: date, **deltas) -> None:
+    """Add the given deltas (e.g. workouts=1) to the user's row for `day`."""
+    deltas = {column: value for column, value in deltas.items() if value}
+    if not deltas:
+        return
+
+    upsert(
+        session,
+        UserDailyStats,
+        {"user_id": user_id, "day": day, **deltas},
+        index_elements=KEY,
+        increment=deltas.keys(),
+    )
+
+
+def set_water(session: Session, user_id: int, day: date, glasses: int) -> None:
+    """Water is logged as an absolute per-day value, so it overwrites instead of adding."""
+    upsert(
+        session,
+        UserDailyStats,
+        {"user_id": user_id, "day": day, "water_glasses": glasses},
+        index_elements=KEY,
+        replace=("water_glasses",),
+    )
+
+
+# kolona u rollup-u -> (model, vremenska kolona, agregat)
+SOURCES = {
+    "workouts": (WorkoutSession, WorkoutSession.start_time, func.count()),
+    # Kalorije se računaju po danu kad je vežba urađena (isto kao u log_exercise)
+    "calories_burned": (WorkoutSession, Exercise.completed_at, func.sum(Exercise.calories_burned)),
+    "study_seconds": (StudySession, StudySession.start_time, func.sum(StudySession.total_duration)),
+    "pomodoros": (StudySession, StudySession.start_time, func.sum(StudySession.pomodoro_count)),
+    "focus_sessions": (FocusSession, FocusSession.completed_at, func.count()),
+    "mood_sum": (MoodCheckin, MoodCheckin.created_at, func.sum(MoodCheckin.mood_score)),
+    "mood_count": (MoodCheckin, MoodCheckin.created_at, func.count()),
+    "water_glasses": (WaterIntake, WaterIntake.date, func.sum(WaterIntake.glasses)),
+}
+
+
+def backfill(session: Session, user_id: Optional[int] = None, chunk_size: int = 1000) -> int:
+    """Rebuild the rollup (for one user or everyone) from the raw tables; returns the number of rows written."""
+    stmt = delete(UserDailyStats)
+    if user_id is not None:
+        stmt = stmt.where(UserDailyStats.user_id == user_id)  # type: ignore
+    session.execute(stmt)
+
+    rows: dict[tuple, dict] = {}
+    for column, (model, time_column, aggregate) in SOURCES.items():
+        day = func.date(time_column)
+        query = select(model.user_id, day, aggregate).group_by(model.user_id, day)
+        if time_column.table is not model.__table__:
+            query = query.select_from(model).join(Exercise, Exercise.session_id == model.id)
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+
+        for uid, raw_day, value in session.exec(query):
+            # SQLite vraća DATE() kao string
+            day_value = date.fromisoformat(raw_day) if isinstance(raw_day, str) else raw_day
+            row = rows.setdefault((uid, day_value), {"user_id": uid, "day": day_value, **dict.fromkeys(SOURCES, 0)})
+            row[column] = value or 0
+
+    values = list(rows.values())
+    for start in range(0, len(values), chunk_size):
+        session.execute(insert(UserDailyStats), values[start:start + chunk_size])
+
+    return len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the user_daily_stats rollup")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="rebuild the rollup from the raw tables")
+    backfill_parser.add_argument("--user", type=int, default=None, help="only rebuild this user")
+    args = parser.parse_args()
+
+    init_db()
+    with Session(engine) as session:
+        written = backfill(session, user_id=args.user)
+        session.commit()
+    print(f"Rebuilt {written} user_daily_stats rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,158 @@
 import os
-import uuid
+from functools import wraps
 from datetime import datetime, timedelta
-from typing import Optional
-
-from flask import Blueprint, jsonify, make_response, request
-from models import SessionDB, User, engine
-from sqlmodel import Session, select
+from typing import NamedTuple, Optional
+
+import account
+import etag
+import export
+import tokens
+from cache import TTLCache
+from db import get_db
+from flask import Blueprint, Response, g, jsonify, make_response, request, stream_with_context
+from models import AccountDeletion, LegacySessionDB, SessionDB, User
+from sqlmodel import delete, desc, select, update
 
 is_production = os.getenv("ENV") != "development"
 
 auth_bp = Blueprint('auth', __name__)
 
+
+class AuthUser(NamedTuple):
+    """Lightweight principal for the logged in user (no password hash)."""
+    id: int
+    username: str
+    email: str
+    full_name: str
+
+
+# Keš sesija: id sesije (16 bajtova) -> (user, expires_at). Samo validne sesije ulaze u keš.
+# Keš je po procesu: logout, brisanje naloga i izmena naloga ga prazne samo u radniku koji je
+# obradio zahtev, pa ostali gunicorn radnici mogu da služe staru sesiju (i stari /account)
+# najviše SESSION_CACHE_TTL sekundi. Zato je TTL kratak: i par sekundi skida većinu upita
+# sa stranica koje odjednom šalju više zahteva, a opoziv kasni najviše toliko.
+session_cache = TTLCache(
+    maxsize=int(os.getenv("SESSION_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("SESSION_CACHE_TTL", "5")),
+)
+
+MAX_SESSIONS_PER_USER = int(os.getenv("MAX_SESSIONS_PER_USER", "10"))
+
+
+def invalidate_user_sessions(user_id: int) -> None:
+    """Drop every cached session belonging to the given user."""
+    session_cache.pop_where(lambda entry: entry[0].id == user_id)
+
 def create_session(user_id: int) -> tuple[Optional[str], Optional[datetime]]:
-    """Create a new session for a user and return the session UUID and expiration datetime."""
-    session_uuid = str(uuid.uuid4())
+    """Create a new session for a user and return the cookie token and expiration datetime."""
+    session_id = tokens.new_session_id()
     created_at = datetime.now()
     expires_at = created_at + timedelta(days=90)  # 3 meseca
 
     try:
-        with Session(engine) as session:
-            db_session = SessionDB(
-                session_uuid=session_uuid,
-                user_id=user_id,
-                created_at=created_at,
-                expires_at=expires_at,
-                is_valid=True
-            )
-            session.add(db_session)
-            session.commit()
-            return session_uuid, expires_at
+        session = get_db()
+        db_session = SessionDB(
+            id=session_id,
+            user_id=user_id,
+            created_at=created_at,
+            expires_at=expires_at,
+            is_valid=True
+        )
+        session.add(db_session)
+        session.flush()
+
+        # Najviše MAX_SESSIONS_PER_USER sesija po korisniku; najstarije se brišu
+        stale = session.exec(
+            select(SessionDB.id)
+            .where(SessionDB.user_id == user_id)
+            .order_by(desc(SessionDB.created_at))
+            .offset(MAX_SESSIONS_PER_USER)
+        ).all()
+        if stale:
+            session.execute(delete(SessionDB).where(SessionDB.id.in_(stale)))  # type: ignore
+            for stale_id in stale:
+                session_cache.pop(stale_id)
+
+        return tokens.encode(session_id, expires_at), expires_at
     except Exception as e:
         print("Error creating session:", e)
         return None, None
 
 
-def get_user_from_session() -> Optional[User]:
-    """Retrieves the user based on the sessid cookie."""
+def get_user_from_session() -> Optional[AuthUser]:
+    """Retrieves the user based on the sessid cookie (resolved at most once per request)."""
+    if "user" in g:
+        return g.user
+
+    g.user = _resolve_user()
+    return g.user
+
+
+def _resolve_user() -> Optional[AuthUser]:
     sessid = request.cookies.get("sessid")
     if not sessid:
         return None
 
+    # Neispravan, falsifikovan ili istekao token odbijamo bez upita u bazu
+    token = tokens.decode(sessid)
+    if token is None:
+        return None
+
+    cached = session_cache.get(token.session_id)
+    if cached:
+        user, expires_at = cached
+        if expires_at < datetime.now():
+            session_cache.pop(token.session_id)
+            return None
+        return user
+
     try:
-        with Session(engine) as session:
-            db_session = session.exec(
-                select(SessionDB).where(SessionDB.session_uuid == sessid)
+        session = get_db()
+        now = datetime.now()
+        # Jedan upit: sesija + korisnik, samo kolone koje nam trebaju
+        row = session.exec(
+            select(User.id, User.username, User.email, User.full_name, SessionDB.expires_at)
+            .join(SessionDB, SessionDB.user_id == User.id)  # type: ignore
+            .where(
+                SessionDB.id == token.session_id,
+                SessionDB.is_valid == True,  # noqa: E712
+                SessionDB.expires_at >= now
+            )
+        ).first()
+
+        if not row and token.legacy:
+            # Stari UUID kolačić čija sesija još nije prebačena (migrate.py)
+            row = session.exec(
+                select(User.id, User.username, User.email, User.full_name, LegacySessionDB.expires_at)
+                .join(LegacySessionDB, LegacySessionDB.user_id == User.id)  # type: ignore
+                .where(
+                    LegacySessionDB.session_uuid == sessid,
+                    LegacySessionDB.is_valid == True,  # noqa: E712
+                    LegacySessionDB.expires_at >= now
+                )
             ).first()
 
-            if not db_session or not db_session.is_valid:
-                return None
+        if not row:
+            return None
 
-            if db_session.expires_at < datetime.now():
-                return None
-
-            user = session.get(User, db_session.user_id)
-            return user
+        user = AuthUser(row.id, row.username, row.email, row.full_name)
+        session_cache.set(token.session_id, (user, row.expires_at))
+        return user
 
     except Exception as e:
         print("Error fetching user from session:", e)
         return None
 
+
+def require_user(view):
+    """Decorator for routes that need a logged in user; the principal is available as g.user."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not get_user_from_session():
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
 @auth_bp.route("/register", methods=["POST"])
 def register():
     data = request.get_json(silent=True)
@@ -75,31 +169,30 @@ def register():
         return jsonify({"error": "All fields are required"}), 400
 
     try:
-        with Session(engine) as session:
-            # Da li mejl već postoji?
-            existing_user = session.exec(
-                select(User).where(User.email == email)
-            ).first()
-
-            if existing_user:
-                return jsonify({"error": "Email already registered"}), 400
-
-            new_user = User(
-                username=username,
-                email=email,
-                full_name=full_name,
-                password_hash=password_hash
-            )
-            session.add(new_user)
-            session.commit()
-            session.refresh(new_user)
+        session = get_db()
+        # Da li mejl već postoji?
+        existing_user = session.exec(
+            select(User).where(User.email == email)
+        ).first()
+
+        if existing_user:
+            return jsonify({"error": "Email already registered"}), 400
+
+        new_user = User(
+            username=username,
+            email=email,
+            full_name=full_name,
+            password_hash=password_hash
+        )
+        session.add(new_user)
+        session.flush()
 
-            if not new_user.id:
-                return jsonify({"error": "User not found"}), 404
-            user_id = new_user.id
+        if not new_user.id:
+            return jsonify({"error": "User not found"}), 404
+        user_id = new_user.id
 
-        session_uuid, expires_at = create_session(user_id)
-        if not session_uuid:
+        token, expires_at = create_session(user_id)
+        if not token:
             return jsonify({"error": "Failed to create session"}), 500
 
         response = make_response(jsonify({
@@ -113,7 +206,7 @@ def register():
         }), 201)
         response.set_cookie(
             "sessid",
-            session_uuid,
+            token,
             expires=expires_at,
             httponly=True,
             samesite="None" if is_production else "Lax",
@@ -142,44 +235,45 @@ def login():
         return jsonify({"error": "email and password_hash are required"}), 400
 
     try:
-        with Session(engine) as session:
-            user = session.exec(
-                select(User).where(
-                    User.email == email,
-                    User.password_hash == password_hash
-                )
-            ).first()
+        session = get_db()
+        user = session.exec(
+            select(User).where(
+                User.email == email,
+                User.password_hash == password_hash,
+                User.id.not_in(select(AccountDeletion.user_id))  # type: ignore
+            )
+        ).first()
 
-            if not user:
-                return jsonify({"error": "Invalid email or password"}), 401
+        if not user:
+            return jsonify({"error": "Invalid email or password"}), 401
 
-            if not user.id:
-                return jsonify({"error": "User not found"}), 404
+        if not user.id:
+            return jsonify({"error": "User not found"}), 404
 
-            session_uuid, expires_at = create_session(user.id)
-            if not session_uuid:
-                return jsonify({"error": "Failed to create session"}), 500
-
-            response = make_response(jsonify({
-                "message": "Login successful",
-                "user": {
-                    "id": user.id,
-                    "username": user.username,
-                    "email": user.email,
-                    "full_name": user.full_name
-                }
-            }), 200)
-            response.set_cookie(
-                "sessid",
-                session_uuid,
-                expires=expires_at,
-                httponly=True,
-                samesite="None" if is_production else "Lax",
-                secure=is_production,
-                domain=".hoi5.com" if is_production else None,
-                path="/",
-            )
-            return response
+        token, expires_at = create_session(user.id)
+        if not token:
+            return jsonify({"error": "Failed to create session"}), 500
+
+        response = make_response(jsonify({
+            "message": "Login successful",
+            "user": {
+                "id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "full_name": user.full_name
+            }
+        }), 200)
+        response.set_cookie(
+            "sessid",
+            token,
+            expires=expires_at,
+            httponly=True,
+            samesite="None" if is_production else "Lax",
+            secure=is_production,
+            domain=".hoi5.com" if is_production else None,
+            path="/",
+        )
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -191,17 +285,25 @@ def logout():
 
     if sessid:
         try:
-            with Session(engine) as session:
-                db_session = session.exec(
-                    select(SessionDB).where(SessionDB.session_uuid == sessid)
-                ).first()
-
-                if db_session:
-                    db_session.is_valid = False
-                    session.add(db_session)
-                    session.commit()
+            token = tokens.decode(sessid, check_expiry=False)
+            if token:
+                session = get_db()
+                # Istekla odmah, da bi je session_gc pokupio preko ix_auth_sessions_expires
+                session.execute(
+                    update(SessionDB)
+                    .where(SessionDB.id == token.session_id)  # type: ignore
+                    .values(is_valid=False, expires_at=datetime.now())
+                )
+                if token.legacy:
+                    session.execute(
+                        update(LegacySessionDB)
+                        .where(LegacySessionDB.session_uuid == sessid)  # type: ignore
+                        .values(is_valid=False, expires_at=datetime.now())
+                    )
+                session_cache.pop(token.session_id)
         except Exception as e:
             print("Error invalidating session:", e)
+            get_db().rollback()
 
     response = make_response(jsonify({"message": "Logout successful"}), 200)
     response.set_cookie(
@@ -218,90 +320,87 @@ def logout():
 
 
 @auth_bp.route("/account", methods=["GET"])
+@require_user
+@etag.from_user
 def get_account():
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    user_response = {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "full_name": user.full_name
-    }
-    return jsonify({"user": user_response}), 200
+    return jsonify({"user": g.user._asdict()}), 200
+
+
+@auth_bp.route("/account/export", methods=["GET"])
+@require_user
+def export_account():
+    """Stream all of the user's data as NDJSON (default) or one JSON document (?format=json)"""
+    user = g.user
+    fmt = request.args.get("format", "ndjson")
+
+    if fmt == "ndjson":
+        body, mimetype = export.ndjson(user._asdict(), user.id), "application/x-ndjson"
+    elif fmt == "json":
+        body, mimetype = export.json_document(user._asdict(), user.id), "application/json"
+    else:
+        return jsonify({"error": "format must be 'ndjson' or 'json'"}), 400
+
+    response = Response(stream_with_context(export.buffered(body)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=hzs-export-{user.id}.{fmt}"
+    return response
 
 
 @auth_bp.route("/account", methods=["PUT"])
+@require_user
 def update_account():
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     data = request.get_json(silent=True)
     if not data:
         return jsonify({"error": "Invalid JSON"}), 400
 
+    changes = {
+        field: data[field]
+        for field in ("username", "email", "full_name", "password_hash")
+        if field in data
+    }
+
     try:
-        with Session(engine) as session:
-            db_user = session.get(User, user.id)
-            if not db_user:
+        if changes:
+            session = get_db()
+            result = session.exec(
+                update(User).where(User.id == user.id).values(**changes)  # type: ignore
+            )
+            if result.rowcount == 0:
                 return jsonify({"error": "User not found"}), 404
+            invalidate_user_sessions(user.id)
 
-            if "username" in data:
-                db_user.username = data["username"]
-            if "email" in data:
-                db_user.email = data["email"]
-            if "full_name" in data:
-                db_user.full_name = data["full_name"]
-            if "password_hash" in data:
-                db_user.password_hash = data["password_hash"]
-
-            session.add(db_user)
-            session.commit()
-            session.refresh(db_user)
-
-            return jsonify({
-                "message": "Account updated successfully",
-                "user": {
-                    "id": db_user.id,
-                    "username": db_user.username,
-                    "email": db_user.email,
-                    "full_name": db_user.full_name
-                }
-            }), 200
+        updated = user._replace(**{k: v for k, v in changes.items() if k != "password_hash"})
+        return jsonify({
+            "message": "Account updated successfully",
+            "user": updated._asdict()
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @auth_bp.route("/account", methods=["DELETE"])
+@require_user
 def delete_account():
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    """Delete the account and all its data; big accounts are purged in the background (202)"""
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            sessions_to_delete = session.exec(
-                select(SessionDB).where(SessionDB.user_id == user.id)
-            ).all()
-            for sess in sessions_to_delete:
-                session.delete(sess)
-
-            db_user = session.get(User, user.id)
-            if db_user:
-                session.delete(db_user)
-
-            session.commit()
+        session = get_db()
+        if account.count_rows(session, user.id, account.ACCOUNT_DELETE_SYNC_LIMIT) > account.ACCOUNT_DELETE_SYNC_LIMIT:
+            account.schedule_deletion(session, user.id)
+            session.flush()
+            invalidate_user_sessions(user.id)
+
+            response = make_response(jsonify({"message": "Account deletion scheduled"}), 202)
+            # Pokreće se tek kad je odgovor poslat, tj. posle commit-a oznake
+            response.call_on_close(lambda: account.purge_in_background(user.id))
+        else:
+            account.delete_user(session, user.id)
+            invalidate_user_sessions(user.id)
+            response = make_response(jsonify({"message": "Account deleted successfully"}), 200)
 
-        response = make_response(jsonify({"message": "Account deleted successfully"}), 200)
         response.set_cookie(
             "sessid",
             "",
@@ -1,190 +1,199 @@
 from datetime import date, datetime, timedelta
-
-from flask import Blueprint, jsonify, request
-from models import FocusSession, GratitudeEntry, engine
-from routes.auth import get_user_from_session
+from typing import Optional
+
+import rollup
+from db import get_db
+from flask import Blueprint, g, jsonify, request
+from idempotency import idempotent
+from models import FocusSession, GratitudeEntry
+from pagination import keyset, page_args, split_page
+from routes.auth import require_user
 from sqlmodel import Session, desc, select
 
 focus_bp = Blueprint('focus', __name__)
 
-@focus_bp.route("/focus/session", methods=["POST"])
-def create_focus_session():
-    """Create a new focus session (breathing, meditation, or ambient)"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
-
-    data = request.get_json(silent=True)
-    if not data:
-        return jsonify({"error": "Invalid or missing JSON"}), 400
+def record_focus_session(
+    session: Session, user_id: int, data: dict, occurred_at: Optional[datetime] = None
+) -> tuple[dict, int]:
+    """Validate and store a focus session; returns (response body, status). Shared with /sync.
 
+    `occurred_at` (when an offline event really happened) defaults to now.
+    """
     session_type = data.get("session_type")
     duration = data.get("duration")
     breathing_pattern = data.get("breathing_pattern")
     ambient_sound = data.get("ambient_sound")
 
     if not session_type or duration is None:
-        return jsonify({"error": "session_type and duration are required"}), 400
+        return {"error": "session_type and duration are required"}, 400
 
     valid_types = ["breathing", "meditation", "ambient"]
     if session_type not in valid_types:
-        return jsonify({"error": f"session_type must be one of {valid_types}"}), 400
+        return {"error": f"session_type must be one of {valid_types}"}, 400
+
+    focus = FocusSession(
+        user_id=user_id,
+        session_type=session_type,
+        duration=duration,
+        breathing_pattern=breathing_pattern,
+        ambient_sound=ambient_sound,
+        completed_at=occurred_at or datetime.now()
+    )
+    session.add(focus)
+    session.flush()
+    rollup.bump(session, user_id, focus.completed_at.date(), focus_sessions=1)
+
+    return {
+        "message": "Focus session created successfully",
+        "session": {
+            "id": focus.id,
+            "session_type": focus.session_type,
+            "duration": focus.duration,
+            "completed_at": focus.completed_at.isoformat()
+        }
+    }, 201
+
+
+@focus_bp.route("/focus/session", methods=["POST"])
+@require_user
+@idempotent
+def create_focus_session():
+    """Create a new focus session (breathing, meditation, or ambient)"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid or missing JSON"}), 400
 
     try:
-        with Session(engine) as session:
-            focus = FocusSession(
-                user_id=user.id,
-                session_type=session_type,
-                duration=duration,
-                breathing_pattern=breathing_pattern,
-                ambient_sound=ambient_sound
-            )
-            session.add(focus)
-            session.commit()
-            session.refresh(focus)
-
-            return jsonify({
-                "message": "Focus session created successfully",
-                "session": {
-                    "id": focus.id,
-                    "session_type": focus.session_type,
-                    "duration": focus.duration,
-                    "completed_at": focus.completed_at.isoformat()
-                }
-            }), 201
+        body, status = record_focus_session(get_db(), g.user.id, data)
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @focus_bp.route("/focus/history", methods=["GET"])
+@require_user
 def get_focus_history():
-    """Get last 20 focus sessions for the current user"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    """Get focus sessions for the current user, newest first (?limit=&cursor=)"""
+    user = g.user
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    try:
+        limit, cursor = page_args(FocusSession.completed_at, default_limit=20)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        with Session(engine) as session:
-            sessions = session.exec(
-                select(FocusSession)
-                .where(FocusSession.user_id == user.id)
-                .order_by(desc(FocusSession.completed_at))
-                .limit(20)
-            ).all()
-
-            history = [
-                {
-                    "id": s.id,
-                    "session_type": s.session_type,
-                    "duration": s.duration,
-                    "breathing_pattern": s.breathing_pattern,
-                    "ambient_sound": s.ambient_sound,
-                    "completed_at": s.completed_at.isoformat()
-                }
-                for s in sessions
-            ]
-
-            return jsonify({"sessions": history}), 200
+        session = get_db()
+        sessions = session.exec(keyset(
+            select(FocusSession).where(FocusSession.user_id == user.id),
+            FocusSession.completed_at, FocusSession.id, limit, cursor
+        )).all()
+        sessions, next_cursor = split_page(sessions, limit, lambda s: (s.completed_at, s.id))
+
+        history = [
+            {
+                "id": s.id,
+                "session_type": s.session_type,
+                "duration": s.duration,
+                "breathing_pattern": s.breathing_pattern,
+                "ambient_sound": s.ambient_sound,
+                "completed_at": s.completed_at.isoformat()
+            }
+            for s in sessions
+        ]
+
+        return jsonify({"sessions": history, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Gratitude journal
 
-@focus_bp.route("/gratitude", methods=["POST"])
-def create_gratitude_entry():
-    """Create a new gratitude journal entry"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
-
-    data = request.get_json(silent=True)
-    if not data:
-        return jsonify({"error": "Invalid or missing JSON"}), 400
-
+def record_gratitude(
+    session: Session, user_id: int, data: dict, occurred_at: Optional[datetime] = None
+) -> tuple[dict, int]:
+    """Validate and store a gratitude entry; returns (response body, status). Shared with /sync."""
     entry_text = data.get("entry_text")
     date_str = data.get("date")
 
     if not entry_text or not date_str:
-        return jsonify({"error": "entry_text and date are required"}), 400
+        return {"error": "entry_text and date are required"}, 400
 
     if len(entry_text) > 5000:
-        return jsonify({"error": "Entry text must be 5000 characters or less"}), 400
+        return {"error": "Entry text must be 5000 characters or less"}, 400
 
     try:
         entry_date = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
-        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        return {"error": "Invalid date format. Use YYYY-MM-DD"}, 400
+
+    entry = GratitudeEntry(
+        user_id=user_id,
+        entry_text=entry_text,
+        date=entry_date,
+        created_at=occurred_at or datetime.now()
+    )
+    session.add(entry)
+    session.flush()
+
+    return {
+        "message": "Gratitude entry created successfully",
+        "entry": {
+            "id": entry.id,
+            "entry_text": entry.entry_text,
+            "date": entry.date.isoformat(),
+            "created_at": entry.created_at.isoformat()
+        }
+    }, 201
+
+
+@focus_bp.route("/gratitude", methods=["POST"])
+@require_user
+@idempotent
+def create_gratitude_entry():
+    """Create a new gratitude journal entry"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid or missing JSON"}), 400
 
     try:
-        with Session(engine) as session:
-            entry = GratitudeEntry(
-                user_id=user.id,
-                entry_text=entry_text,
-                date=entry_date
-            )
-            session.add(entry)
-            session.commit()
-            session.refresh(entry)
-
-            return jsonify({
-                "message": "Gratitude entry created successfully",
-                "entry": {
-                    "id": entry.id,
-                    "entry_text": entry.entry_text,
-                    "date": entry.date.isoformat(),
-                    "created_at": entry.created_at.isoformat()
-                }
-            }), 201
+        body, status = record_gratitude(get_db(), g.user.id, data)
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @focus_bp.route("/gratitude/recent", methods=["GET"])
+@require_user
 def get_recent_gratitude():
     """Get gratitude entries from the last 7 days"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            week_ago = date.today() - timedelta(days=6)
-
-            entries = session.exec(
-                select(GratitudeEntry)
-                .where(
-                    GratitudeEntry.user_id == user.id,
-                    GratitudeEntry.date >= week_ago
-                )
-                .order_by(desc(GratitudeEntry.date))
-            ).all()
-
-            recent = [
-                {
-                    "id": e.id,
-                    "entry_text": e.entry_text,
-                    "date": e.date.isoformat(),
-                    "created_at": e.created_at.isoformat()
-                }
-                for e in entries
-            ]
-
-            return jsonify({"entries": recent}), 200
+        session = get_db()
+        week_ago = date.today() - timedelta(days=6)
+
+        entries = session.exec(
+            select(GratitudeEntry)
+            .where(
+                GratitudeEntry.user_id == user.id,
+                GratitudeEntry.date >= week_ago
+            )
+            .order_by(desc(GratitudeEntry.date))
+        ).all()
+
+        recent = [
+            {
+                "id": e.id,
+                "entry_text": e.entry_text,
+                "date": e.date.isoformat(),
+                "created_at": e.created_at.isoformat()
+            }
+            for e in entries
+        ]
+
+        return jsonify({"entries": recent}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,22 +1,20 @@
 
-from flask import Blueprint, jsonify, request
-from models import OnboardingData, engine
-from routes.auth import get_user_from_session
-from sqlmodel import Session, select
+import etag
+from db import get_db
+from flask import Blueprint, g, jsonify, request
+from models import OnboardingData
+from routes.auth import require_user
+from sqlmodel import select
 import sys
 
 onboarding_bp = Blueprint('onboarding', __name__)
 
 
 @onboarding_bp.route("/onboarding", methods=["POST"])
+@require_user
 def submit_onboarding():
     """Submit onboarding quiz data and generate recommendations"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     data = request.get_json(silent=True)
     if not data:
@@ -42,95 +40,93 @@ def submit_onboarding():
     recommendations_text = " ".join(recommendations)
 
     try:
-        with Session(engine) as session:
-            existing = session.exec(
-                select(OnboardingData).where(OnboardingData.user_id == user.id)
-            ).first()
-
-            if existing:
-                existing.categories = categories
-                existing.physical_goals = physical_goals
-                existing.study_goals = study_goals
-                existing.focus_goals = focus_goals
-                existing.stress_goals = stress_goals
-                existing.recommendations = recommendations_text
-                session.add(existing)
-            else:
-                onboarding = OnboardingData(
-                    user_id=user.id,
-                    categories=categories,
-                    physical_goals=physical_goals,
-                    study_goals=study_goals,
-                    focus_goals=focus_goals,
-                    stress_goals=stress_goals,
-                    recommendations=recommendations_text
-                )
-                session.add(onboarding)
-
-            session.commit()
-
-            return jsonify({
-                "message": "Onboarding completed successfully",
-                "recommendations": recommendations_text
-            }), 201
+        session = get_db()
+        existing = session.exec(
+            select(OnboardingData).where(OnboardingData.user_id == user.id)
+        ).first()
+
+        if existing:
+            existing.categories = categories
+            existing.physical_goals = physical_goals
+            existing.study_goals = study_goals
+            existing.focus_goals = focus_goals
+            existing.stress_goals = stress_goals
+            existing.recommendations = recommendations_text
+            session.add(existing)
+        else:
+            onboarding = OnboardingData(
+                user_id=user.id,
+                categories=categories,
+                physical_goals=physical_goals,
+                study_goals=study_goals,
+                focus_goals=focus_goals,
+                stress_goals=stress_goals,
+                recommendations=recommendations_text
+            )
+            session.add(onboarding)
+
+        etag.bump(session, user.id, "onboarding")
+        session.flush()
+
+        return jsonify({
+            "message": "Onboarding completed successfully",
+            "recommendations": recommendations_text
+        }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @onboarding_bp.route("/goals", methods=["GET"])
+@require_user
+@etag.versioned("onboarding")
 def get_goals():
-    user = get_user_from_session()
-    if not user or not user.id:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = g.user
 
-    with Session(engine) as session:
+    session = get_db()
+    onboarding = session.exec(
+        select(OnboardingData).where(OnboardingData.user_id == user.id)
+    ).first()
+
+    if not onboarding:
+        return jsonify({"error": "No onboarding data found"}), 404
+
+    pg = onboarding.physical_goals or {}
+    sg = onboarding.study_goals or {}
+
+
+    return jsonify({
+        "water_per_day_glasses": pg.get("water_glasses_per_day", 0),
+        "calories_per_week": pg.get("calories_burn_per_week", 0),
+        "study_hours_per_week": sg.get("study_hours_per_week", 0),
+        "completed_at": onboarding.completed_at.isoformat(),
+    }), 200
+
+@onboarding_bp.route("/onboarding", methods=["GET"])
+@require_user
+@etag.versioned("onboarding")
+def get_onboarding():
+    """Get saved onboarding data for the current user"""
+    user = g.user
+
+    try:
+        session = get_db()
         onboarding = session.exec(
             select(OnboardingData).where(OnboardingData.user_id == user.id)
         ).first()
 
         if not onboarding:
             return jsonify({"error": "No onboarding data found"}), 404
-        
-        pg = onboarding.physical_goals or {}
-        sg = onboarding.study_goals or {}
 
-        
         return jsonify({
-            "water_per_day_glasses": pg.get("water_glasses_per_day", 0),
-            "calories_per_week": pg.get("calories_burn_per_week", 0),
-            "study_hours_per_week": sg.get("study_hours_per_week", 0),
-            "completed_at": onboarding.completed_at.isoformat(),
+            "categories": onboarding.categories,
+            "physical_goals": onboarding.physical_goals,
+            "study_goals": onboarding.study_goals,
+            "focus_goals": onboarding.focus_goals,
+            "stress_goals": onboarding.stress_goals,
+            "recommendations": onboarding.recommendations,
+            "completed_at": onboarding.completed_at.isoformat()
         }), 200
 
-@onboarding_bp.route("/onboarding", methods=["GET"])
-def get_onboarding():
-    """Get saved onboarding data for the current user"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
-
-    try:
-        with Session(engine) as session:
-            onboarding = session.exec(
-                select(OnboardingData).where(OnboardingData.user_id == user.id)
-            ).first()
-
-            if not onboarding:
-                return jsonify({"error": "No onboarding data found"}), 404
-
-            return jsonify({
-                "categories": onboarding.categories,
-                "physical_goals": onboarding.physical_goals,
-                "study_goals": onboarding.study_goals,
-                "focus_goals": onboarding.focus_goals,
-                "stress_goals": onboarding.stress_goals,
-                "recommendations": onboarding.recommendations,
-                "completed_at": onboarding.completed_at.isoformat()
-            }), 200
-
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
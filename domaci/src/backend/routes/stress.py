@@ -1,267 +1,271 @@
-from datetime import datetime, timedelta
-
-from flask import Blueprint, jsonify, request
-from models import MoodCheckin, StressJournal, engine
-from routes.auth import get_user_from_session
-from sqlmodel import Session, func, select, desc
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import rollup
+from db import get_db
+from flask import Blueprint, g, jsonify, request
+from idempotency import idempotent
+from models import MoodCheckin, StressJournal, UserDailyStats
+from pagination import keyset, page_args, split_page
+from routes.auth import require_user
+from sqlmodel import Session, func, select
 
 stress_bp = Blueprint('stress', __name__)
 
 # Mood check-in
 
-@stress_bp.route("/mood", methods=["POST"])
-def create_mood_checkin():
-    """Create a new mood check-in"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
-
-    data = request.get_json(silent=True)
-    if not data:
-        return jsonify({"error": "Invalid or missing JSON"}), 400
+def record_mood(
+    session: Session, user_id: int, data: dict, occurred_at: Optional[datetime] = None
+) -> tuple[dict, int]:
+    """Validate and store a mood check-in; returns (response body, status). Shared with /sync.
 
+    `occurred_at` (when an offline event really happened) defaults to now.
+    """
     mood_score = data.get("mood_score")
     notes = data.get("notes")
 
     if mood_score is None:
-        return jsonify({"error": "mood_score is required"}), 400
+        return {"error": "mood_score is required"}, 400
 
     if not (1 <= mood_score <= 5):
-        return jsonify({"error": "mood_score must be between 1 and 5"}), 400
+        return {"error": "mood_score must be between 1 and 5"}, 400
 
     if notes and len(notes) > 5000:
-        return jsonify({"error": "Notes must be 5000 characters or less"}), 400
+        return {"error": "Notes must be 5000 characters or less"}, 400
+
+    mood = MoodCheckin(
+        user_id=user_id,
+        mood_score=mood_score,
+        notes=notes,
+        created_at=occurred_at or datetime.now()
+    )
+    session.add(mood)
+    session.flush()
+    rollup.bump(session, user_id, mood.created_at.date(), mood_sum=mood_score, mood_count=1)
+
+    return {
+        "message": "Mood check-in created successfully",
+        "mood": {
+            "id": mood.id,
+            "mood_score": mood.mood_score,
+            "notes": mood.notes,
+            "created_at": mood.created_at.isoformat()
+        }
+    }, 201
+
+
+@stress_bp.route("/mood", methods=["POST"])
+@require_user
+@idempotent
+def create_mood_checkin():
+    """Create a new mood check-in"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid or missing JSON"}), 400
 
     try:
-        with Session(engine) as session:
-            mood = MoodCheckin(
-                user_id=user.id,
-                mood_score=mood_score,
-                notes=notes
-            )
-            session.add(mood)
-            session.commit()
-            session.refresh(mood)
-
-            return jsonify({
-                "message": "Mood check-in created successfully",
-                "mood": {
-                    "id": mood.id,
-                    "mood_score": mood.mood_score,
-                    "notes": mood.notes,
-                    "created_at": mood.created_at.isoformat()
-                }
-            }), 201
+        body, status = record_mood(get_db(), g.user.id, data)
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @stress_bp.route("/mood/recent", methods=["GET"])
+@require_user
 def get_recent_moods():
-    """Get mood check-ins from the last 14 days"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    """Get mood check-ins from the last 14 days, newest first (?limit=&cursor=)"""
+    user = g.user
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    try:
+        limit, cursor = page_args(MoodCheckin.created_at, default_limit=100)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        with Session(engine) as session:
-            two_weeks_ago = datetime.now() - timedelta(days=13)
-
-            moods = session.exec(
-                select(MoodCheckin)
-                .where(
-                    MoodCheckin.user_id == user.id,
-                    MoodCheckin.created_at >= two_weeks_ago
-                )
-                .order_by(desc(MoodCheckin.created_at))
-            ).all()
-
-            recent = [
-                {
-                    "id": m.id,
-                    "mood_score": m.mood_score,
-                    "notes": m.notes,
-                    "created_at": m.created_at.isoformat()
-                }
-                for m in moods
-            ]
-
-            return jsonify({"moods": recent}), 200
+        session = get_db()
+        two_weeks_ago = datetime.now() - timedelta(days=13)
+
+        moods = session.exec(keyset(
+            select(MoodCheckin).where(
+                MoodCheckin.user_id == user.id,
+                MoodCheckin.created_at >= two_weeks_ago
+            ),
+            MoodCheckin.created_at, MoodCheckin.id, limit, cursor
+        )).all()
+        moods, next_cursor = split_page(moods, limit, lambda m: (m.created_at, m.id))
+
+        recent = [
+            {
+                "id": m.id,
+                "mood_score": m.mood_score,
+                "notes": m.notes,
+                "created_at": m.created_at.isoformat()
+            }
+            for m in moods
+        ]
+
+        return jsonify({"moods": recent, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @stress_bp.route("/mood/average", methods=["GET"])
+@require_user
 def get_mood_average():
     """Get average mood score for the last 7 days"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            week_ago = datetime.now() - timedelta(days=6)
-
-            # Izračunaj prosek
-            result = session.exec(
-                select(func.avg(MoodCheckin.mood_score))
-                .where(
-                    MoodCheckin.user_id == user.id,
-                    MoodCheckin.created_at >= week_ago
-                )
-            ).first()
-
-            # Resultat je None ako nema moods
-            average = float(result) if result else 0.0
-
-            return jsonify({
-                "average": round(average, 2),
-                "period": "7days"
-            }), 200
+        session = get_db()
+        today = date.today()
+        week_ago = today - timedelta(days=6)
+
+        # Izračunaj prosek iz dnevnog rollup-a
+        mood_sum, mood_count = session.exec(
+            select(func.sum(UserDailyStats.mood_sum), func.sum(UserDailyStats.mood_count))
+            .where(
+                UserDailyStats.user_id == user.id,
+                UserDailyStats.day >= week_ago,
+                UserDailyStats.day <= today
+            )
+        ).one()
+
+        # Nema moods -> 0
+        average = float(mood_sum) / mood_count if mood_count else 0.0
+
+        return jsonify({
+            "average": round(average, 2),
+            "period": "7days"
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Stress journal
 
+def record_journal(
+    session: Session, user_id: int, data: dict, occurred_at: Optional[datetime] = None
+) -> tuple[dict, int]:
+    """Validate and store a stress journal entry; returns (response body, status). Shared with /sync."""
+    entry_text = data.get("entry_text")
+
+    if not entry_text:
+        return {"error": "entry_text is required"}, 400
+
+    if len(entry_text) > 5000:
+        return {"error": "Entry text must be 5000 characters or less"}, 400
+
+    entry = StressJournal(
+        user_id=user_id,
+        entry_text=entry_text,
+        created_at=occurred_at or datetime.now()
+    )
+    session.add(entry)
+    session.flush()
+
+    return {
+        "message": "Journal entry created successfully",
+        "entry": {
+            "id": entry.id,
+            "entry_text": entry.entry_text,
+            "created_at": entry.created_at.isoformat()
+        }
+    }, 201
+
+
 @stress_bp.route("/journal", methods=["POST"])
+@require_user
+@idempotent
 def create_journal_entry():
     """Create a new stress journal entry"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
-
     data = request.get_json(silent=True)
     if not data:
         return jsonify({"error": "Invalid or missing JSON"}), 400
 
-    entry_text = data.get("entry_text")
-
-    if not entry_text:
-        return jsonify({"error": "entry_text is required"}), 400
-
-    if len(entry_text) > 5000:
-        return jsonify({"error": "Entry text must be 5000 characters or less"}), 400
-
     try:
-        with Session(engine) as session:
-            entry = StressJournal(
-                user_id=user.id,
-                entry_text=entry_text
-            )
-            session.add(entry)
-            session.commit()
-            session.refresh(entry)
-
-            return jsonify({
-                "message": "Journal entry created successfully",
-                "entry": {
-                    "id": entry.id,
-                    "entry_text": entry.entry_text,
-                    "created_at": entry.created_at.isoformat()
-                }
-            }), 201
+        body, status = record_journal(get_db(), g.user.id, data)
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @stress_bp.route("/journal/recent", methods=["GET"])
+@require_user
 def get_recent_journal_entries():
-    """Get the last 10 journal entries"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    """Get journal entries, newest first, 10 per page (?limit=&cursor=)"""
+    user = g.user
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    try:
+        limit, cursor = page_args(StressJournal.created_at, default_limit=10)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        with Session(engine) as session:
-            entries = session.exec(
-                select(StressJournal)
-                .where(StressJournal.user_id == user.id)
-                .order_by(desc(StressJournal.created_at))
-                .limit(10)
-            ).all()
-
-            recent = [
-                {
-                    "id": e.id,
-                    "entry_text": e.entry_text,
-                    "created_at": e.created_at.isoformat()
-                }
-                for e in entries
-            ]
-
-            return jsonify({"entries": recent}), 200
+        session = get_db()
+        entries = session.exec(keyset(
+            select(StressJournal).where(StressJournal.user_id == user.id),
+            StressJournal.created_at, StressJournal.id, limit, cursor
+        )).all()
+        entries, next_cursor = split_page(entries, limit, lambda e: (e.created_at, e.id))
+
+        recent = [
+            {
+                "id": e.id,
+                "entry_text": e.entry_text,
+                "created_at": e.created_at.isoformat()
+            }
+            for e in entries
+        ]
+
+        return jsonify({"entries": recent, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @stress_bp.route("/journal/<int:entry_id>", methods=["GET"])
+@require_user
 def get_journal_entry(entry_id: int):
     """Get a specific journal entry"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            entry = session.get(StressJournal, entry_id)
-            if not entry or entry.user_id != user.id:
-                return jsonify({"error": "Journal entry not found"}), 404
-
-            return jsonify({
-                "entry": {
-                    "id": entry.id,
-                    "entry_text": entry.entry_text,
-                    "created_at": entry.created_at.isoformat()
-                }
-            }), 200
+        session = get_db()
+        entry = session.get(StressJournal, entry_id)
+        if not entry or entry.user_id != user.id:
+            return jsonify({"error": "Journal entry not found"}), 404
+
+        return jsonify({
+            "entry": {
+                "id": entry.id,
+                "entry_text": entry.entry_text,
+                "created_at": entry.created_at.isoformat()
+            }
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @stress_bp.route("/journal/<int:entry_id>", methods=["DELETE"])
+@require_user
 def delete_journal_entry(entry_id: int):
     """Delete a journal entry"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            entry = session.get(StressJournal, entry_id)
-            if not entry or entry.user_id != user.id:
-                return jsonify({"error": "Journal entry not found"}), 404
+        session = get_db()
+        entry = session.get(StressJournal, entry_id)
+        if not entry or entry.user_id != user.id:
+            return jsonify({"error": "Journal entry not found"}), 404
 
-            session.delete(entry)
-            session.commit()
+        session.delete(entry)
+        session.flush()
 
-            return jsonify({"message": "Journal entry deleted successfully"}), 200
+        return jsonify({"message": "Journal entry deleted successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
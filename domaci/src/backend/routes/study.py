@@ -1,8 +1,14 @@
 from datetime import date, datetime, timedelta
-
-from flask import Blueprint, jsonify, request
-from models import StudySession, StudyStreak, StudyTask, engine
-from routes.auth import get_user_from_session
+from typing import Optional
+
+import etag
+import rollup
+from db import get_db, increment_counter, increment_counter_dated
+from flask import Blueprint, g, jsonify, request
+from idempotency import idempotent
+from models import StudySession, StudyStreak, StudyTask
+from pagination import cursor_arg, keyset, page_args, split_page
+from routes.auth import require_user
 from sqlmodel import Session, desc, select
 
 study_bp = Blueprint('study', __name__)
@@ -10,182 +16,170 @@ study_bp = Blueprint('study', __name__)
 # Study session
 
 @study_bp.route("/study/start", methods=["POST"])
+@require_user
+@idempotent
 def start_study():
     """Start a new study session"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            study = StudySession(user_id=user.id)
-            session.add(study)
-            session.commit()
-            session.refresh(study)
+        session = get_db()
+        study = StudySession(user_id=user.id)
+        session.add(study)
+        session.flush()
 
-            return jsonify({
-                "session_id": study.id,
-                "start_time": study.start_time.isoformat()
-            }), 201
+        return jsonify({
+            "session_id": study.id,
+            "start_time": study.start_time.isoformat()
+        }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @study_bp.route("/study/<int:session_id>/distraction", methods=["POST"])
+@require_user
 def log_distraction(session_id: int):
     """Increment distraction counter for a study session"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            study = session.get(StudySession, session_id)
-            if not study or study.user_id != user.id:
-                return jsonify({"error": "Study session not found"}), 404
+        session = get_db()
+        distraction_count = increment_counter(session, StudySession, session_id, user.id, "distraction_count")
+        if distraction_count is None:
+            return jsonify({"error": "Study session not found"}), 404
 
-            study.distraction_count += 1
-            session.add(study)
-            session.commit()
-
-            return jsonify({
-                "message": "Distraction logged",
-                "distraction_count": study.distraction_count
-            }), 200
+        return jsonify({
+            "message": "Distraction logged",
+            "distraction_count": distraction_count
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@study_bp.route("/study/<int:session_id>/pomodoro", methods=["POST"])
-def log_pomodoro(session_id: int):
-    """Increment pomodoro counter for a study session"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+def record_pomodoro(session: Session, user_id: int, session_id: int) -> tuple[dict, int]:
+    """Count a finished pomodoro on the user's study session; returns (response body, status). Shared with /sync."""
+    # Dan sesije dolazi iz istog UPDATE-a: isti dan kao u rollup.SOURCES (po start_time), inače se bump i backfill razilaze
+    counted = increment_counter_dated(session, StudySession, session_id, user_id, "pomodoro_count", "start_time")
+    if counted is None:
+        return {"error": "Study session not found"}, 404
+    pomodoro_count, day = counted
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    rollup.bump(session, user_id, day, pomodoros=1)
 
-    try:
-        with Session(engine) as session:
-            study = session.get(StudySession, session_id)
-            if not study or study.user_id != user.id:
-                return jsonify({"error": "Study session not found"}), 404
+    return {
+        "message": "Pomodoro completed",
+        "pomodoro_count": pomodoro_count
+    }, 200
 
-            study.pomodoro_count += 1
-            session.add(study)
-            session.commit()
 
-            return jsonify({
-                "message": "Pomodoro completed",
-                "pomodoro_count": study.pomodoro_count
-            }), 200
+@study_bp.route("/study/<int:session_id>/pomodoro", methods=["POST"])
+@require_user
+def log_pomodoro(session_id: int):
+    """Increment pomodoro counter for a study session"""
+    try:
+        body, status = record_pomodoro(get_db(), g.user.id, session_id)
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @study_bp.route("/study/<int:session_id>/complete", methods=["POST"])
+@require_user
 def complete_study(session_id: int):
     """Complete a study session and update streak"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            study = session.get(StudySession, session_id)
-            if not study or study.user_id != user.id:
-                return jsonify({"error": "Study session not found"}), 404
-
-            study.end_time = datetime.now()
-            study.total_duration = int((study.end_time - study.start_time).total_seconds())
-            session.add(study)
-
-            # Apdejtuj streak:
-            today = date.today()
-            streak = session.exec(
-                select(StudyStreak).where(StudyStreak.user_id == user.id)
-            ).first()
-
-            if not streak:
-                streak = StudyStreak(
-                    user_id=user.id,
-                    current_streak=1,
-                    longest_streak=1,
-                    last_study_date=today
-                )
+        session = get_db()
+        study = session.get(StudySession, session_id)
+        if not study or study.user_id != user.id:
+            return jsonify({"error": "Study session not found"}), 404
+
+        previous_duration = study.total_duration
+        study.end_time = datetime.now()
+        study.total_duration = int((study.end_time - study.start_time).total_seconds())
+        session.add(study)
+        rollup.bump(
+            session, user.id, study.start_time.date(),
+            study_seconds=study.total_duration - previous_duration
+        )
+
+        # Apdejtuj streak:
+        today = date.today()
+        streak = session.exec(
+            select(StudyStreak).where(StudyStreak.user_id == user.id)
+        ).first()
+
+        if not streak:
+            streak = StudyStreak(
+                user_id=user.id,
+                current_streak=1,
+                longest_streak=1,
+                last_study_date=today
+            )
+        else:
+            if streak.last_study_date == today:
+                pass
+            elif streak.last_study_date == today - timedelta(days=1):
+                # Učio juče? Onda povećaj streak:
+                streak.current_streak += 1
+                if streak.current_streak > streak.longest_streak:
+                    streak.longest_streak = streak.current_streak
+                streak.last_study_date = today
             else:
-                if streak.last_study_date == today:
-                    pass
-                elif streak.last_study_date == today - timedelta(days=1):
-                    # Učio juče? Onda povećaj streak:
-                    streak.current_streak += 1
-                    if streak.current_streak > streak.longest_streak:
-                        streak.longest_streak = streak.current_streak
-                    streak.last_study_date = today
-                else:
-                    streak.current_streak = 1
-                    streak.last_study_date = today
-
-            session.add(streak)
-            session.commit()
-            session.refresh(study)
+                streak.current_streak = 1
+                streak.last_study_date = today
 
-            return jsonify({
-                "message": "Study session completed",
-                "total_duration": study.total_duration,
-                "pomodoro_count": study.pomodoro_count,
-                "distraction_count": study.distraction_count
-            }), 200
+        session.add(streak)
+        etag.bump(session, user.id, "study_streak")
+        session.flush()
+
+        return jsonify({
+            "message": "Study session completed",
+            "total_duration": study.total_duration,
+            "pomodoro_count": study.pomodoro_count,
+            "distraction_count": study.distraction_count
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @study_bp.route("/study/history", methods=["GET"])
+@require_user
 def get_study_history():
-    """Get last 20 study sessions for the current user"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    """Get study sessions for the current user, newest first (?limit=&cursor=)"""
+    user = g.user
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    try:
+        limit, cursor = page_args(StudySession.start_time, default_limit=20)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        with Session(engine) as session:
-            studies = session.exec(
-                select(StudySession)
-                .where(StudySession.user_id == user.id)
-                .order_by(desc(StudySession.start_time))
-                .limit(20)
-            ).all()
-
-            history = [
-                {
-                    "id": s.id,
-                    "start_time": s.start_time.isoformat(),
-                    "end_time": s.end_time.isoformat() if s.end_time else None,
-                    "total_duration": s.total_duration,
-                    "pomodoro_count": s.pomodoro_count,
-                    "distraction_count": s.distraction_count
-                }
-                for s in studies
-            ]
-
-            return jsonify({"sessions": history}), 200
+        session = get_db()
+        studies = session.exec(keyset(
+            select(StudySession).where(StudySession.user_id == user.id),
+            StudySession.start_time, StudySession.id, limit, cursor
+        )).all()
+        studies, next_cursor = split_page(studies, limit, lambda s: (s.start_time, s.id))
+
+        history = [
+            {
+                "id": s.id,
+                "start_time": s.start_time.isoformat(),
+                "end_time": s.end_time.isoformat() if s.end_time else None,
+                "total_duration": s.total_duration,
+                "pomodoro_count": s.pomodoro_count,
+                "distraction_count": s.distraction_count
+            }
+            for s in studies
+        ]
+
+        return jsonify({"sessions": history, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -193,14 +187,11 @@ def get_study_history():
 # Study task
 
 @study_bp.route("/study/task", methods=["POST"])
+@require_user
+@idempotent
 def create_task():
     """Create a new study task"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     data = request.get_json(silent=True)
     if not data:
@@ -216,147 +207,144 @@ def create_task():
         return jsonify({"error": "Task name must be 200 characters or less"}), 400
 
     try:
-        with Session(engine) as session:
-            task = StudyTask(
-                user_id=user.id,
-                task_name=task_name,
-                estimated_time=estimated_time
-            )
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-
-            return jsonify({
-                "message": "Task created successfully",
-                "task": {
-                    "id": task.id,
-                    "task_name": task.task_name,
-                    "estimated_time": task.estimated_time,
-                    "completed": task.completed,
-                    "created_at": task.created_at.isoformat()
-                }
-            }), 201
+        session = get_db()
+        task = StudyTask(
+            user_id=user.id,
+            task_name=task_name,
+            estimated_time=estimated_time
+        )
+        session.add(task)
+        session.flush()
+
+        return jsonify({
+            "message": "Task created successfully",
+            "task": {
+                "id": task.id,
+                "task_name": task.task_name,
+                "estimated_time": task.estimated_time,
+                "completed": task.completed,
+                "created_at": task.created_at.isoformat()
+            }
+        }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @study_bp.route("/study/tasks", methods=["GET"])
+@require_user
 def get_tasks():
-    """Get all study tasks (pending and completed) for the current user"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    """Get study tasks, newest first, as two keyset-paged lists (?limit=&pending_cursor=&cursor=)
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    The first page has both lists. After that only the lists whose cursor is passed come
+    back: next_pending_cursor continues pending tasks, next_cursor completed ones.
+    """
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            all_tasks = session.exec(
-                select(StudyTask)
-                .where(StudyTask.user_id == user.id)
-                .order_by(desc(StudyTask.created_at))
-            ).all()
-
-            pending = []
-            completed = []
-
-            for task in all_tasks:
-                task_data = {
-                    "id": task.id,
-                    "task_name": task.task_name,
-                    "estimated_time": task.estimated_time,
-                    "actual_time": task.actual_time,
-                    "completed": task.completed,
-                    "created_at": task.created_at.isoformat(),
-                    "completed_at": task.completed_at.isoformat() if task.completed_at else None
-                }
-
-                if task.completed:
-                    completed.append(task_data)
-                else:
-                    pending.append(task_data)
+        limit, cursor = page_args(StudyTask.created_at, default_limit=100)
+        pending_cursor = cursor_arg(StudyTask.created_at, "pending_cursor")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-            return jsonify({
-                "pending": pending,
-                "completed": completed
-            }), 200
+    first_page = not (cursor or pending_cursor)
+
+    try:
+        session = get_db()
+
+        def task_page(completed: bool, after) -> tuple[list, Optional[str]]:
+            rows = session.exec(keyset(
+                select(StudyTask).where(StudyTask.user_id == user.id, StudyTask.completed == completed),
+                StudyTask.created_at, StudyTask.id, limit, after
+            )).all()
+            return split_page(rows, limit, lambda t: (t.created_at, t.id))
+
+        pending_tasks, next_pending_cursor = task_page(False, pending_cursor) if first_page or pending_cursor else ([], None)
+        completed_tasks, next_cursor = task_page(True, cursor) if first_page or cursor else ([], None)
+
+        def task_data(task: StudyTask) -> dict:
+            return {
+                "id": task.id,
+                "task_name": task.task_name,
+                "estimated_time": task.estimated_time,
+                "actual_time": task.actual_time,
+                "completed": task.completed,
+                "created_at": task.created_at.isoformat(),
+                "completed_at": task.completed_at.isoformat() if task.completed_at else None
+            }
+
+        return jsonify({
+            "pending": [task_data(task) for task in pending_tasks],
+            "completed": [task_data(task) for task in completed_tasks],
+            "next_pending_cursor": next_pending_cursor,
+            "next_cursor": next_cursor
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @study_bp.route("/study/task/<int:task_id>", methods=["PUT"])
+@require_user
 def update_task(task_id: int):
     """Update a study task (mark as completed or update actual time)"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     data = request.get_json(silent=True)
     if not data:
         return jsonify({"error": "Invalid or missing JSON"}), 400
 
     try:
-        with Session(engine) as session:
-            task = session.get(StudyTask, task_id)
-            if not task or task.user_id != user.id:
-                return jsonify({"error": "Task not found"}), 404
-
-            if "completed" in data:
-                task.completed = data["completed"]
-                if task.completed and not task.completed_at:
-                    task.completed_at = datetime.now()
-                elif not task.completed:
-                    task.completed_at = None
-
-            if "actual_time" in data:
-                task.actual_time = data["actual_time"]
-
-            session.add(task)
-            session.commit()
-            session.refresh(task)
-
-            return jsonify({
-                "message": "Task updated successfully",
-                "task": {
-                    "id": task.id,
-                    "task_name": task.task_name,
-                    "estimated_time": task.estimated_time,
-                    "actual_time": task.actual_time,
-                    "completed": task.completed,
-                    "completed_at": task.completed_at.isoformat() if task.completed_at else None
-                }
-            }), 200
+        session = get_db()
+        task = session.get(StudyTask, task_id)
+        if not task or task.user_id != user.id:
+            return jsonify({"error": "Task not found"}), 404
+
+        if "completed" in data:
+            task.completed = data["completed"]
+            if task.completed and not task.completed_at:
+                task.completed_at = datetime.now()
+            elif not task.completed:
+                task.completed_at = None
+
+        if "actual_time" in data:
+            task.actual_time = data["actual_time"]
+
+        session.add(task)
+        session.flush()
+
+        return jsonify({
+            "message": "Task updated successfully",
+            "task": {
+                "id": task.id,
+                "task_name": task.task_name,
+                "estimated_time": task.estimated_time,
+                "actual_time": task.actual_time,
+                "completed": task.completed,
+                "completed_at": task.completed_at.isoformat() if task.completed_at else None
+            }
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @study_bp.route("/study/task/<int:task_id>", methods=["DELETE"])
+@require_user
 def delete_task(task_id: int):
     """Delete a study task"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            task = session.get(StudyTask, task_id)
-            if not task or task.user_id != user.id:
-                return jsonify({"error": "Task not found"}), 404
+        session = get_db()
+        task = session.get(StudyTask, task_id)
+        if not task or task.user_id != user.id:
+            return jsonify({"error": "Task not found"}), 404
 
-            session.delete(task)
-            session.commit()
+        session.delete(task)
+        session.flush()
 
-            return jsonify({"message": "Task deleted successfully"}), 200
+        return jsonify({"message": "Task deleted successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -364,33 +352,30 @@ def delete_task(task_id: int):
 # Study streak
 
 @study_bp.route("/study/streak", methods=["GET"])
+@require_user
+@etag.versioned("study_streak")
 def get_streak():
     """Get study streak information for the current user"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            streak = session.exec(
-                select(StudyStreak).where(StudyStreak.user_id == user.id)
-            ).first()
-
-            if not streak:
-                return jsonify({
-                    "current_streak": 0,
-                    "longest_streak": 0,
-                    "last_study_date": None
-                }), 200
+        session = get_db()
+        streak = session.exec(
+            select(StudyStreak).where(StudyStreak.user_id == user.id)
+        ).first()
 
+        if not streak:
             return jsonify({
-                "current_streak": streak.current_streak,
-                "longest_streak": streak.longest_streak,
-                "last_study_date": streak.last_study_date.isoformat() if streak.last_study_date else None
+                "current_streak": 0,
+                "longest_streak": 0,
+                "last_study_date": None
             }), 200
 
+        return jsonify({
+            "current_streak": streak.current_streak,
+            "longest_streak": streak.longest_streak,
+            "last_study_date": streak.last_study_date.isoformat() if streak.last_study_date else None
+        }), 200
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,166 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from db import get_db
+from flask import Blueprint, g, jsonify, request
+from models import SyncEvent
+from routes.auth import require_user
+from routes.focus import record_focus_session, record_gratitude
+from routes.stress import record_journal, record_mood
+from routes.study import record_pomodoro
+from routes.workout import record_water
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+sync_bp = Blueprint('sync', __name__)
+
+MAX_SYNC_EVENTS = 500
+MAX_KEY_LENGTH = 64
+MAX_EVENT_AGE = timedelta(days=30)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# tip događaja -> funkcija (session, user_id, data, occurred_at) -> (body, status)
+HANDLERS = {
+    "water": record_water,
+    "mood": record_mood,
+    "journal": record_journal,
+    "focus_session": record_focus_session,
+    "gratitude": record_gratitude,
+    # Pomodoro se u rollup-u računa po start_time sesije, pa mu occurred_at ne treba
+    "pomodoro": lambda session, user_id, data, occurred_at: record_pomodoro(session, user_id, data.get("session_id")),
+}
+
+
+def parse_occurred_at(value) -> tuple[Optional[datetime], Optional[str]]:
+    """Parse the optional ISO 8601 `occurred_at` into a naive local datetime; returns (value, error)."""
+    if value is None:
+        return None, None
+
+    try:
+        occurred_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None, "occurred_at must be an ISO 8601 datetime"
+
+    if occurred_at.tzinfo is not None:
+        # Baza čuva lokalno vreme bez zone (datetime.now())
+        occurred_at = occurred_at.astimezone().replace(tzinfo=None)
+
+    now = datetime.now()
+    if not (now - MAX_EVENT_AGE <= occurred_at <= now + MAX_CLOCK_SKEW):
+        return None, f"occurred_at must be within the last {MAX_EVENT_AGE.days} days and not in the future"
+
+    return occurred_at, None
+
+
+def fingerprint(event: dict) -> str:
+    """Hash of what the event does, so a reused idempotency_key with other content can be told apart."""
+    payload = json.dumps(
+        [event["type"], event["data"], event.get("occurred_at")], sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def validate_event(event) -> Optional[str]:
+    """Return an error message if the event envelope is invalid, otherwise None."""
+    if not isinstance(event, dict):
+        return "Invalid event"
+
+    key = event.get("idempotency_key")
+    if not isinstance(key, str) or not (1 <= len(key) <= MAX_KEY_LENGTH):
+        return f"idempotency_key must be a string of 1 to {MAX_KEY_LENGTH} characters"
+
+    if event.get("type") not in HANDLERS:
+        return f"type must be one of {sorted(HANDLERS)}"
+
+    if not isinstance(event.get("data"), dict):
+        return "data must be an object"
+
+    return parse_occurred_at(event.get("occurred_at"))[1]
+
+
+@sync_bp.route("/sync", methods=["POST"])
+@require_user
+def sync_events():
+    """Apply an ordered batch of offline events in one transaction, replaying ones already applied"""
+    user = g.user
+
+    data = request.get_json(silent=True)
+    events = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(events, list) or not events:
+        return jsonify({"error": "events must be a non-empty list"}), 400
+
+    if len(events) > MAX_SYNC_EVENTS:
+        return jsonify({"error": f"At most {MAX_SYNC_EVENTS} events per request"}), 400
+
+    try:
+        session = get_db()
+
+        # Svi već primenjeni ključevi iz ovog batch-a u jednom IN (...) upitu
+        keys = {e["idempotency_key"] for e in events if validate_event(e) is None}
+        applied = {
+            row.idempotency_key: row
+            for row in session.exec(
+                select(SyncEvent).where(
+                    SyncEvent.user_id == user.id,
+                    SyncEvent.idempotency_key.in_(keys)  # type: ignore
+                )
+            ).all()
+        } if keys else {}
+
+        results = []
+        for i, event in enumerate(events):
+            error = validate_event(event)
+            if error:
+                results.append({"index": i, "status": 400, "body": {"error": error}})
+                continue
+
+            key = event["idempotency_key"]
+            result = {"index": i, "idempotency_key": key, "type": event["type"]}
+
+            event_fingerprint = fingerprint(event)
+            done = applied.get(key)
+            if done:
+                if done.fingerprint and done.fingerprint != event_fingerprint:
+                    results.append({**result, "status": 422, "body": {
+                        "error": "idempotency_key was already used with a different event"
+                    }})
+                else:
+                    results.append({**result, "status": done.status, "body": done.response, "replayed": True})
+                continue
+
+            # Svaki događaj u svom SAVEPOINT-u: neuspeh poništava samo njega, ne ceo batch
+            savepoint = session.begin_nested()
+            try:
+                occurred_at, _ = parse_occurred_at(event.get("occurred_at"))
+                body, status = HANDLERS[event["type"]](session, user.id, event["data"], occurred_at)
+                if status >= 400:
+                    savepoint.rollback()
+                else:
+                    done = SyncEvent(
+                        user_id=user.id,
+                        idempotency_key=key,
+                        event_type=event["type"],
+                        fingerprint=event_fingerprint,
+                        status=status,
+                        response=body
+                    )
+                    session.add(done)
+                    session.flush()
+                    savepoint.commit()
+                    applied[key] = done
+            except IntegrityError:
+                # Isti ključ je upravo upisao paralelni zahtev
+                savepoint.rollback()
+                body, status = {"error": "Event with this idempotency_key is already being applied"}, 409
+            except Exception as e:
+                savepoint.rollback()
+                body, status = {"error": str(e)}, 500
+
+            results.append({**result, "status": status, "body": body, "replayed": False})
+
+        return jsonify({"results": results}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
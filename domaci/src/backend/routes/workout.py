@@ -1,312 +1,403 @@
+from collections import defaultdict
 from datetime import date, datetime, timedelta
-
-from flask import Blueprint, jsonify, request
-from models import Exercise, StretchReminder, WaterIntake, WorkoutSession, engine
-from routes.auth import get_user_from_session
-from sqlmodel import Session, asc, desc, select
+from typing import Optional
+
+import etag
+import rollup
+from db import add_to_owned, get_db, upsert
+from flask import Blueprint, g, jsonify, request
+from idempotency import idempotent
+from models import Exercise, StretchReminder, UserDailyStats, WaterIntake, WorkoutSession
+from pagination import keyset, page_args, split_page
+from routes.auth import require_user
+from sqlmodel import Session, asc, insert, select
 
 workout_bp = Blueprint('workout', __name__)
 
+MAX_EXERCISE_BATCH = 200
+
+
+def validate_exercise(data: dict) -> Optional[str]:
+    """Return an error message if the exercise payload is invalid, otherwise None."""
+    reps = data.get("reps")
+
+    if not all([
+        data.get("exercise_type"),
+        reps is not None,
+        data.get("duration") is not None,
+        data.get("calories_burned") is not None
+    ]):
+        return "All fields are required"
+
+    if not isinstance(data["exercise_type"], str):
+        return "exercise_type must be a string"
+
+    # bool je podklasa int-a, pa ga posebno isključujemo
+    for field in ("reps", "duration", "calories_burned"):
+        if isinstance(data[field], bool) or not isinstance(data[field], (int, float)):
+            return f"{field} must be a number"
+
+    if not (0 <= reps <= 1000):
+        return "Reps must be between 0 and 1000"
+
+    return None
+
 # Workout session
 
 @workout_bp.route("/workout/start", methods=["POST"])
+@require_user
+@idempotent
 def start_workout():
     """Start a new workout session"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            workout = WorkoutSession(user_id=user.id)
-            session.add(workout)
-            session.commit()
-            session.refresh(workout)
+        session = get_db()
+        workout = WorkoutSession(user_id=user.id)
+        session.add(workout)
+        session.flush()
+        rollup.bump(session, user.id, workout.start_time.date(), workouts=1)
 
-            return jsonify({
-                "session_id": workout.id,
-                "start_time": workout.start_time.isoformat()
-            }), 201
+        return jsonify({
+            "session_id": workout.id,
+            "start_time": workout.start_time.isoformat()
+        }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @workout_bp.route("/workout/<int:session_id>/exercise", methods=["POST"])
+@require_user
+@idempotent
 def log_exercise(session_id: int):
     """Log an exercise to a workout session"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     data = request.get_json(silent=True)
     if not data:
         return jsonify({"error": "Invalid or missing JSON"}), 400
 
+    error = validate_exercise(data)
+    if error:
+        return jsonify({"error": error}), 400
+
     exercise_type = data.get("exercise_type")
     reps = data.get("reps")
     duration = data.get("duration")
     calories_burned = data.get("calories_burned")
 
-    if not all([exercise_type, reps is not None, duration is not None, calories_burned is not None]):
-        return jsonify({"error": "All fields are required"}), 400
+    try:
+        session = get_db()
+        # Provera vlasništva i sabiranje kalorija u jednom UPDATE-u
+        if not add_to_owned(session, WorkoutSession, session_id, user.id, total_calories_burned=calories_burned):
+            return jsonify({"error": "Workout session not found"}), 404
+
+        exercise = Exercise(
+            session_id=session_id,
+            exercise_type=exercise_type,
+            reps=reps,
+            duration=duration,
+            calories_burned=calories_burned
+        )
+        session.add(exercise)
+        session.flush()
+        rollup.bump(session, user.id, exercise.completed_at.date(), calories_burned=calories_burned)
+
+        return jsonify({
+            "message": "Exercise logged successfully",
+            "exercise_id": exercise.id,
+            "completed_at": exercise.completed_at.isoformat()
+        }), 201
 
-    if not (0 <= reps <= 1000):
-        return jsonify({"error": "Reps must be between 0 and 1000"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-    try:
-        with Session(engine) as session:
-            workout = session.get(WorkoutSession, session_id)
-            if not workout or workout.user_id != user.id:
-                return jsonify({"error": "Workout session not found"}), 404
-
-            exercise = Exercise(
-                session_id=session_id,
-                exercise_type=exercise_type,
-                reps=reps,
-                duration=duration,
-                calories_burned=calories_burned
-            )
-            session.add(exercise)
 
-            workout.total_calories_burned += calories_burned
-            session.add(workout)
+@workout_bp.route("/workout/<int:session_id>/exercises", methods=["POST"])
+@require_user
+@idempotent
+def log_exercises(session_id: int):
+    """Log a whole set of exercises to a workout session in one transaction"""
+    user = g.user
 
-            session.commit()
-            session.refresh(exercise)
+    data = request.get_json(silent=True)
+    exercises = data.get("exercises") if isinstance(data, dict) else None
+    if not isinstance(exercises, list) or not exercises:
+        return jsonify({"error": "exercises must be a non-empty list"}), 400
+
+    if len(exercises) > MAX_EXERCISE_BATCH:
+        return jsonify({"error": f"At most {MAX_EXERCISE_BATCH} exercises per request"}), 400
+
+    for i, item in enumerate(exercises):
+        error = validate_exercise(item) if isinstance(item, dict) else "Invalid exercise"
+        if error:
+            return jsonify({"error": f"exercises[{i}]: {error}"}), 400
+
+    completed_at = datetime.now()
+    rows = [
+        {
+            "session_id": session_id,
+            "exercise_type": item["exercise_type"],
+            "reps": item["reps"],
+            "duration": item["duration"],
+            "calories_burned": item["calories_burned"],
+            "completed_at": completed_at
+        }
+        for item in exercises
+    ]
 
-            return jsonify({
-                "message": "Exercise logged successfully",
-                "exercise_id": exercise.id,
-                "completed_at": exercise.completed_at.isoformat()
-            }), 201
+    try:
+        total_calories = sum(row["calories_burned"] for row in rows)
+        session = get_db()
+        if not add_to_owned(session, WorkoutSession, session_id, user.id, total_calories_burned=total_calories):
+            return jsonify({"error": "Workout session not found"}), 404
+
+        # Jedan multi-row INSERT (executemany) za ceo set
+        session.execute(insert(Exercise), rows)
+        rollup.bump(session, user.id, completed_at.date(), calories_burned=total_calories)
+
+        return jsonify({
+            "message": "Exercises logged successfully",
+            "count": len(rows),
+            "calories_burned": total_calories,
+            "completed_at": completed_at.isoformat()
+        }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @workout_bp.route("/workout/<int:session_id>/complete", methods=["POST"])
+@require_user
 def complete_workout(session_id: int):
     """Complete a workout session"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            workout = session.get(WorkoutSession, session_id)
-            if not workout or workout.user_id != user.id:
-                return jsonify({"error": "Workout session not found"}), 404
+        session = get_db()
+        workout = session.get(WorkoutSession, session_id)
+        if not workout or workout.user_id != user.id:
+            return jsonify({"error": "Workout session not found"}), 404
 
-            workout.end_time = datetime.now()
-            workout.total_duration = int((workout.end_time - workout.start_time).total_seconds())
+        workout.end_time = datetime.now()
+        workout.total_duration = int((workout.end_time - workout.start_time).total_seconds())
 
-            session.add(workout)
-            session.commit()
-            session.refresh(workout)
+        session.add(workout)
+        session.flush()
 
-            return jsonify({
-                "message": "Workout completed successfully",
-                "total_duration": workout.total_duration,
-                "total_calories": workout.total_calories_burned
-            }), 200
+        return jsonify({
+            "message": "Workout completed successfully",
+            "total_duration": workout.total_duration,
+            "total_calories": workout.total_calories_burned
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @workout_bp.route("/workout/history", methods=["GET"])
+@require_user
 def get_workout_history():
-    """Get last 20 workout sessions for the current user"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    """Get workout sessions for the current user, newest first (?limit=&cursor=, ?include=exercises adds their exercises)"""
+    user = g.user
+    include_exercises = "exercises" in request.args.get("include", "").split(",")
 
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    try:
+        limit, cursor = page_args(WorkoutSession.start_time, default_limit=20)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        with Session(engine) as session:
-            workouts = session.exec(
-                select(WorkoutSession)
-                .where(WorkoutSession.user_id == user.id)
-                .order_by(desc(WorkoutSession.start_time))
-                .limit(20)
+        session = get_db()
+        workouts = session.exec(keyset(
+            select(WorkoutSession).where(WorkoutSession.user_id == user.id),
+            WorkoutSession.start_time, WorkoutSession.id, limit, cursor
+        )).all()
+        workouts, next_cursor = split_page(workouts, limit, lambda w: (w.start_time, w.id))
+
+        history = [
+            {
+                "id": workout.id,
+                "start_time": workout.start_time.isoformat(),
+                "end_time": workout.end_time.isoformat() if workout.end_time else None,
+                "total_duration": workout.total_duration,
+                "total_calories_burned": workout.total_calories_burned
+            }
+            for workout in workouts
+        ]
+
+        if include_exercises and workouts:
+            # Sve vežbe u jednom IN (...) upitu umesto jednog upita po treningu
+            exercises = session.exec(
+                select(Exercise)
+                .where(Exercise.session_id.in_([w.id for w in workouts]))  # type: ignore
+                .order_by(asc(Exercise.completed_at), asc(Exercise.id))
             ).all()
 
-            history = []
-            for workout in workouts:
-                exercises = session.exec(
-                    select(Exercise).where(Exercise.session_id == workout.id)
-                ).all()
-
-                history.append({
-                    "id": workout.id,
-                    "start_time": workout.start_time.isoformat(),
-                    "end_time": workout.end_time.isoformat() if workout.end_time else None,
-                    "total_duration": workout.total_duration,
-                    "total_calories_burned": workout.total_calories_burned,
-                    "exercises": [
-                        {
-                            "id": ex.id,
-                            "exercise_type": ex.exercise_type,
-                            "reps": ex.reps,
-                            "duration": ex.duration,
-                            "calories_burned": ex.calories_burned,
-                            "completed_at": ex.completed_at.isoformat()
-                        }
-                        for ex in exercises
-                    ]
+            by_workout = defaultdict(list)
+            for ex in exercises:
+                by_workout[ex.session_id].append({
+                    "id": ex.id,
+                    "exercise_type": ex.exercise_type,
+                    "reps": ex.reps,
+                    "duration": ex.duration,
+                    "calories_burned": ex.calories_burned,
+                    "completed_at": ex.completed_at.isoformat()
                 })
 
-            return jsonify({"workouts": history}), 200
+            for item in history:
+                item["exercises"] = by_workout[item["id"]]
+
+        return jsonify({"workouts": history, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Water intake
 
-@workout_bp.route("/water", methods=["POST"])
-def log_water():
-    """Log water intake for a specific date"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
-
-    data = request.get_json(silent=True)
-    if not data:
-        return jsonify({"error": "Invalid or missing JSON"}), 400
+def record_water(
+    session: Session, user_id: int, data: dict, occurred_at: Optional[datetime] = None
+) -> tuple[dict, int]:
+    """Validate and store a water intake log; returns (response body, status). Shared with /sync.
 
+    By default `glasses` is the day's total; with "mode": "increment" it is added to it.
+    """
     glasses = data.get("glasses")
     date_str = data.get("date")
+    mode = data.get("mode", "set")
 
     if glasses is None or not date_str:
-        return jsonify({"error": "glasses and date are required"}), 400
+        return {"error": "glasses and date are required"}, 400
+
+    if mode not in ("set", "increment"):
+        return {"error": "mode must be 'set' or 'increment'"}, 400
 
-    if not (0 <= glasses <= 20):
-        return jsonify({"error": "Glasses must be between 0 and 20"}), 400
+    if mode == "set" and not (0 <= glasses <= 20):
+        return {"error": "Glasses must be between 0 and 20"}, 400
+
+    if mode == "increment" and not (1 <= glasses <= 20):
+        return {"error": "Increment must be between 1 and 20"}, 400
 
     try:
         intake_date = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
-        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        return {"error": "Invalid date format. Use YYYY-MM-DD"}, 400
+
+    # Jedan INSERT ... ON DUPLICATE KEY UPDATE na uq_water_intake_user_date, bez SELECT-a unapred
+    upsert(
+        session,
+        WaterIntake,
+        {"user_id": user_id, "date": intake_date, "glasses": glasses, "logged_at": occurred_at or datetime.now()},
+        index_elements=("user_id", "date"),
+        increment=("glasses",) if mode == "increment" else (),
+        replace=("logged_at",) if mode == "increment" else ("glasses", "logged_at"),
+    )
+
+    if mode == "increment":
+        total = session.exec(
+            select(WaterIntake.glasses).where(
+                WaterIntake.user_id == user_id,
+                WaterIntake.date == intake_date
+            )
+        ).one()
+        # Isti opseg kao za "set"; 400 poništava upsert (rollback zahteva, odnosno savepoint-a u /sync)
+        if total > 20:
+            return {"error": "Daily total can't exceed 20 glasses"}, 400
+        rollup.bump(session, user_id, intake_date, water_glasses=glasses)
+        glasses = total
+    else:
+        rollup.set_water(session, user_id, intake_date, glasses)
+    etag.bump(session, user_id, "water")
+
+    return {
+        "message": "Water intake logged successfully",
+        "glasses": glasses,
+        "date": date_str
+    }, 201
 
-    try:
-        with Session(engine) as session:
-            # Proveri da li već postoji:
-            existing = session.exec(
-                select(WaterIntake).where(
-                    WaterIntake.user_id == user.id,
-                    WaterIntake.date == intake_date
-                )
-            ).first()
-
-            if existing:
-                existing.glasses = glasses
-                existing.logged_at = datetime.now()
-                session.add(existing)
-            else:
-                water = WaterIntake(
-                    user_id=user.id,
-                    glasses=glasses,
-                    date=intake_date
-                )
-                session.add(water)
-
-            session.commit()
 
-            return jsonify({
-                "message": "Water intake logged successfully",
-                "glasses": glasses,
-                "date": date_str
-            }), 201
+@workout_bp.route("/water", methods=["POST"])
+@require_user
+@idempotent
+def log_water():
+    """Log water intake for a specific date"""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid or missing JSON"}), 400
+
+    try:
+        body, status = record_water(get_db(), g.user.id, data)
+        return jsonify(body), status
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @workout_bp.route("/water/today", methods=["GET"])
+@require_user
+@etag.versioned("water", daily=True)
 def get_water_today():
     """Get water intake for today"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            today = date.today()
-            water = session.exec(
-                select(WaterIntake).where(
-                    WaterIntake.user_id == user.id,
-                    WaterIntake.date == today
-                )
-            ).first()
-
-            if not water:
-                return jsonify({
-                    "glasses": 0,
-                    "date": today.isoformat()
-                }), 200
+        session = get_db()
+        today = date.today()
+        water = session.exec(
+            select(WaterIntake).where(
+                WaterIntake.user_id == user.id,
+                WaterIntake.date == today
+            )
+        ).first()
 
+        if not water:
             return jsonify({
-                "glasses": water.glasses,
-                "date": water.date.isoformat()
+                "glasses": 0,
+                "date": today.isoformat()
             }), 200
 
+        return jsonify({
+            "glasses": water.glasses,
+            "date": water.date.isoformat()
+        }), 200
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @workout_bp.route("/water/week", methods=["GET"])
+@require_user
+@etag.versioned("water", daily=True)
 def get_water_week():
     """Get water intake for the last 7 days"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            today = date.today()
-            week_ago = today - timedelta(days=6)
-
-            water_entries = session.exec(
-                select(WaterIntake).where(
-                    WaterIntake.user_id == user.id,
-                    WaterIntake.date >= week_ago,
-                    WaterIntake.date <= today
-                ).order_by(asc(WaterIntake.date))
-            ).all()
+        session = get_db()
+        today = date.today()
+        week_ago = today - timedelta(days=6)
+
+        water_entries = session.exec(
+            select(UserDailyStats.day, UserDailyStats.water_glasses).where(
+                UserDailyStats.user_id == user.id,
+                UserDailyStats.day >= week_ago,
+                UserDailyStats.day <= today
+            )
+        ).all()
 
-            water_dict = {entry.date: entry.glasses for entry in water_entries}
+        water_dict = {day: glasses for day, glasses in water_entries}
 
-            # Za svih 7 dana...
-            week_data = []
-            for i in range(7):
-                day = week_ago + timedelta(days=i)
-                week_data.append({
-                    "date": day.isoformat(),
-                    "glasses": water_dict.get(day, 0)
-                })
+        # Za svih 7 dana...
+        week_data = []
+        for i in range(7):
+            day = week_ago + timedelta(days=i)
+            week_data.append({
+                "date": day.isoformat(),
+                "glasses": water_dict.get(day, 0)
+            })
 
-            return jsonify({"week": week_data}), 200
+        return jsonify({"week": week_data}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -314,56 +405,48 @@ def get_water_week():
 # Stretch reminder
 
 @workout_bp.route("/stretch/remind", methods=["POST"])
+@require_user
+@idempotent
 def create_stretch_reminder():
     """Create a new stretch reminder"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            reminder = StretchReminder(user_id=user.id)
-            session.add(reminder)
-            session.commit()
-            session.refresh(reminder)
+        session = get_db()
+        reminder = StretchReminder(user_id=user.id)
+        session.add(reminder)
+        session.flush()
 
-            return jsonify({
-                "reminder_id": reminder.id,
-                "reminded_at": reminder.reminded_at.isoformat()
-            }), 201
+        return jsonify({
+            "reminder_id": reminder.id,
+            "reminded_at": reminder.reminded_at.isoformat()
+        }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @workout_bp.route("/stretch/<int:reminder_id>/complete", methods=["POST"])
+@require_user
 def complete_stretch(reminder_id: int):
     """Mark a stretch reminder as completed"""
-    user = get_user_from_session()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    if not user.id:
-        return jsonify({"error": "User not found"}), 404
+    user = g.user
 
     try:
-        with Session(engine) as session:
-            reminder = session.get(StretchReminder, reminder_id)
-            if not reminder or reminder.user_id != user.id:
-                return jsonify({"error": "Reminder not found"}), 404
-
-            reminder.completed = True
-            reminder.completed_at = datetime.now()
-            session.add(reminder)
-            session.commit()
-
-            return jsonify({
-                "message": "Stretch completed successfully",
-                "completed_at": reminder.completed_at.isoformat()
-            }), 200
+        session = get_db()
+        reminder = session.get(StretchReminder, reminder_id)
+        if not reminder or reminder.user_id != user.id:
+            return jsonify({"error": "Reminder not found"}), 404
+
+        reminder.completed = True
+        reminder.completed_at = datetime.now()
+        session.add(reminder)
+        session.flush()
+
+        return jsonify({
+            "message": "Stretch completed successfully",
+            "completed_at": reminder.completed_at.isoformat()
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
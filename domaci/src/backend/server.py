@@ -1,19 +1,30 @@
 import datetime
+import logging
+import os
 import time
 
+import db
+import idempotency
+import metrics
+import querydebug
+import session_gc
 from dotenv import load_dotenv
 from flask import Flask, jsonify
 from flask_cors import CORS
-from models import init_db
+from models import engine, init_db
+from ops import require_ops_token
+from pool import pool_stats
+from sqlalchemy import text
 import sys
 
 # Import all blueprints
-from routes.auth import auth_bp
+from routes.auth import MAX_SESSIONS_PER_USER, auth_bp, session_cache
 from routes.dashboard import dashboard_bp
 from routes.focus import focus_bp
 from routes.onboarding import onboarding_bp
 from routes.stress import stress_bp
 from routes.study import study_bp
+from routes.sync import sync_bp
 from routes.workout import workout_bp
 
 load_dotenv()
@@ -27,6 +38,21 @@ CORS(
     supports_credentials=True,
 )
 
+# Per-route latency / DB time / query count histograms at /metrics (after_request hooks
+# run in reverse order, so these two are registered first to see the committed response)
+metrics.init_app(app, engine)
+
+# Slow-query log + N+1 detector (SQL_DEBUG=1, development/staging only)
+if querydebug.ENABLED:
+    logging.basicConfig(level=logging.INFO)
+    querydebug.init_app(app, engine)
+
+# Idempotency-Key replay
+idempotency.init_app(app)
+
+# Request-scoped DB session (commit/rollback based on the response status)
+db.init_app(app)
+
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(onboarding_bp)
@@ -35,9 +61,14 @@ app.register_blueprint(study_bp)
 app.register_blueprint(focus_bp)
 app.register_blueprint(stress_bp)
 app.register_blueprint(dashboard_bp)
+app.register_blueprint(sync_bp)
+
+# Initialize database tables (gunicorn does it once in the master, see gunicorn.conf.py)
+if not os.getenv("SKIP_INIT_DB"):
+    init_db()
 
-# Initialize database tables
-init_db()
+# Optional in-process session sweeper (SESSION_GC_INTERVAL > 0)
+session_gc.start_background_sweeper()
 
 # --------------------
 # Health / Time endpoints
@@ -54,6 +85,55 @@ def health():
     }), 200
 
 
+@app.route("/health/cache", methods=["GET"])
+@require_ops_token
+def health_cache():
+    return jsonify({
+        "status": "ok",
+        "session_cache": session_cache.stats(),
+        "idempotency": idempotency.store.stats()
+    }), 200
+
+
+@app.route("/health/sessions", methods=["GET"])
+@require_ops_token
+def health_sessions():
+    try:
+        table = session_gc.table_stats()
+    except Exception:
+        app.logger.exception("Session table stats failed")
+        return jsonify({"status": "error", "error": "Database unavailable"}), 503
+
+    return jsonify({
+        "status": "ok",
+        "table": table,
+        "last_sweep": session_gc.last_sweep or None,
+        "max_sessions_per_user": MAX_SESSIONS_PER_USER
+    }), 200
+
+
+@app.route("/health/db", methods=["GET"])
+def health_db():
+    start = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        # Poruka drajvera sadrži host i korisnika baze; ide samo u log, ne u javni odgovor
+        app.logger.exception("Database health check failed")
+        return jsonify({
+            "status": "error",
+            "error": "Database unavailable",
+            "pool": pool_stats(engine)
+        }), 503
+
+    return jsonify({
+        "status": "ok",
+        "ping_ms": round((time.perf_counter() - start) * 1000, 3),
+        "pool": pool_stats(engine)
+    }), 200
+
+
 @app.route("/time", methods=["GET"])
 def time_rn():
     global x
@@ -65,7 +145,6 @@ def time_rn():
         "date": str(datetime.datetime.now())
     }), 200
 
-print(app.url_map)
-
 if __name__ == "__main__":
+    # Samo za lokalni razvoj; produkcija ide preko gunicorn-a (gunicorn.conf.py)
     app.run(host="127.0.0.1", port=5050)
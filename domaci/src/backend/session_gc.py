@@ -0,0 +1,140 @@
+"""
+Garbage collector for the sessions table and old /sync results.
+
+Logout expires a session on the spot (expires_at = now), so everything dead is
+`expires_at < now` and the sweep is a range scan on ix_auth_sessions_expires, deleted in
+short batches with a commit after each. The same pass deletes sync_events older than
+SYNC_EVENT_RETENTION_DAYS (ix_sync_events_created); a client retrying an event after that
+would have it applied again, so keep the retention well above how long clients queue offline.
+Run it from cron / a systemd timer:
+
+    python session_gc.py sweep [--batch-size 1000] [--every SECONDS]
+
+or in-process by setting SESSION_GC_INTERVAL (seconds) for the API server.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from models import SessionDB, SyncEvent, engine, init_db
+from sqlalchemy import text
+from sqlmodel import Session, delete, func, select
+
+SESSION_GC_BATCH_SIZE = int(os.getenv("SESSION_GC_BATCH_SIZE", "1000"))
+SESSION_GC_INTERVAL = float(os.getenv("SESSION_GC_INTERVAL", "0"))
+SYNC_EVENT_RETENTION_DAYS = int(os.getenv("SYNC_EVENT_RETENTION_DAYS", "90"))
+
+# Rezultat poslednjeg prolaza u ovom procesu (za /health/sessions)
+last_sweep: dict = {}
+
+
+def sweep(batch_size: int = SESSION_GC_BATCH_SIZE) -> dict:
+    """Delete expired and logged-out sessions in batches; returns the sweep metrics."""
+    started = time.perf_counter()
+    now = datetime.now()
+    deleted = batches = 0
+
+    with Session(engine) as session:
+        while True:
+            ids = session.exec(
+                select(SessionDB.id).where(SessionDB.expires_at < now).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            session.execute(delete(SessionDB).where(SessionDB.id.in_(ids)))  # type: ignore
+            session.commit()
+            deleted += len(ids)
+            batches += 1
+            if len(ids) < batch_size:
+                break
+
+    last_sweep.update(
+        finished_at=datetime.now().isoformat(),
+        deleted=deleted,
+        batches=batches,
+        duration_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
+    return dict(last_sweep)
+
+
+def sweep_sync_events(retention_days: int = SYNC_EVENT_RETENTION_DAYS, batch_size: int = SESSION_GC_BATCH_SIZE) -> int:
+    """Delete /sync results older than the retention window in batches; returns how many were deleted."""
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    deleted = 0
+
+    with Session(engine) as session:
+        while True:
+            ids = session.exec(
+                select(SyncEvent.id).where(SyncEvent.created_at < cutoff).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            session.execute(delete(SyncEvent).where(SyncEvent.id.in_(ids)))  # type: ignore
+            session.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+
+    last_sweep["sync_events_deleted"] = deleted
+    return deleted
+
+
+def table_stats() -> dict:
+    """Row count of the sessions table (InnoDB's estimate on MySQL, so it doesn't scan) and how many are live."""
+    with Session(engine) as session:
+        if session.get_bind().dialect.name == "mysql":
+            rows = session.execute(text(
+                "SELECT table_rows FROM information_schema.tables"
+                " WHERE table_schema = DATABASE() AND table_name = 'auth_sessions'"
+            )).scalar()
+        else:
+            rows = session.exec(select(func.count()).select_from(SessionDB)).one()
+
+        expired = session.exec(
+            select(func.count()).select_from(SessionDB).where(SessionDB.expires_at < datetime.now())
+        ).one()
+
+    return {"rows": rows, "expired": expired}
+
+
+def start_background_sweeper(interval: float = SESSION_GC_INTERVAL) -> Optional[threading.Thread]:
+    """Sweep every `interval` seconds in a daemon thread (no-op when interval is 0)."""
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                sweep()
+                sweep_sync_events()
+            except Exception as e:
+                print("Session sweep failed:", e)
+
+    thread = threading.Thread(target=run, name="session-gc", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired and logged-out sessions and old /sync results")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sweep_parser = sub.add_parser("sweep", help="delete dead sessions in batches")
+    sweep_parser.add_argument("--batch-size", type=int, default=SESSION_GC_BATCH_SIZE)
+    sweep_parser.add_argument("--every", type=float, default=0, help="keep running, sweeping every N seconds")
+    args = parser.parse_args()
+
+    init_db()
+    while True:
+        print(sweep(args.batch_size), table_stats())
+        print({"sync_events_deleted": sweep_sync_events(batch_size=args.batch_size)})
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
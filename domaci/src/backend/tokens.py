@@ -0,0 +1,82 @@
+"""
+Session cookie tokens.
+
+A token carries the 16-byte session id (the BINARY(16) primary key of auth_sessions)
+and the expiry as a unix timestamp, base64url-encoded, plus an HMAC-SHA256 tag when
+SESSION_SECRET is set:
+
+    <base64url(id | expires)>.<base64url(hmac[:16])>
+
+decode() rejects malformed, forged and expired tokens without touching the database;
+the sessions table stays the source of truth for logout/revocation. Legacy cookies
+(the 36-character UUID strings) decode to the same 16 bytes, with no expiry.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import struct
+import uuid
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+SESSION_SECRET = os.getenv("SESSION_SECRET", "").encode()
+
+_PAYLOAD = struct.Struct(">16sI")
+_TAG_SIZE = 16
+
+
+class SessionToken(NamedTuple):
+    session_id: bytes
+    expires_at: Optional[datetime]  # None za stare UUID kolačiće
+
+    @property
+    def legacy(self) -> bool:
+        return self.expires_at is None
+
+
+def new_session_id() -> bytes:
+    return uuid.uuid4().bytes
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _tag(payload: bytes) -> bytes:
+    return hmac.new(SESSION_SECRET, payload, hashlib.sha256).digest()[:_TAG_SIZE]
+
+
+def encode(session_id: bytes, expires_at: datetime) -> str:
+    payload = _PAYLOAD.pack(session_id, int(expires_at.timestamp()))
+    token = _b64encode(payload)
+    if SESSION_SECRET:
+        token += "." + _b64encode(_tag(payload))
+    return token
+
+
+def decode(token: str, check_expiry: bool = True) -> Optional[SessionToken]:
+    """Parse a cookie value; None if it is malformed, has a bad signature or (new tokens) has expired."""
+    if len(token) == 36:
+        try:
+            return SessionToken(uuid.UUID(token).bytes, None)
+        except ValueError:
+            return None
+
+    payload_part, _, tag_part = token.partition(".")
+    try:
+        payload = _b64decode(payload_part)
+        session_id, expires = _PAYLOAD.unpack(payload)
+        if SESSION_SECRET and not hmac.compare_digest(_b64decode(tag_part), _tag(payload)):
+            return None
+    except (ValueError, struct.error):
+        return None
+
+    expires_at = datetime.fromtimestamp(expires)
+    if check_expiry and expires_at < datetime.now():
+        return None
+    return SessionToken(session_id, expires_at)
@@ -0,0 +1,4 @@
+"""Production WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+from server import app
+
+__all__ = ["app"]
@@ -61,11 +61,11 @@ kill -9 $PID
 
 echo "💀 Port $PORT is now free"
 
-# Start server with venv python
-echo "Starting Flask server..."
-nohup venv/bin/python server.py > backend.log 2>&1 &
+# Start server from the venv
+echo "Starting API (gunicorn, gthread workers)..."
+nohup venv/bin/gunicorn -c gunicorn.conf.py wsgi:app > backend.log 2>&1 &
 
-echo "✅ Flask started on port 5050"
+echo "✅ API started on port 5050"
 
 ############################
 # DONE
@@ -61,6 +61,8 @@ interface StudyTask {
 interface StudyTasksResponse {
   pending?: StudyTask[];
   completed?: StudyTask[];
+  next_pending_cursor?: string | null;
+  next_cursor?: string | null;
 }
 
 interface StudyHistoryItem {
@@ -239,6 +241,36 @@ const Dashboard: React.FC = () => {
     return (await res.json()) as T;
   };
 
+  // /study/tasks and /mood/recent are paged; follow the cursors so the counts cover everything
+  const fetchAllTasks = async (): Promise<StudyTasksResponse> => {
+    const all = { pending: [] as StudyTask[], completed: [] as StudyTask[] };
+    let query = '';
+    while (true) {
+      const data = await apiFetch<StudyTasksResponse>(`/study/tasks${query}`);
+      all.pending.push(...(data?.pending ?? []));
+      all.completed.push(...(data?.completed ?? []));
+
+      const params = new URLSearchParams();
+      if (data?.next_pending_cursor) params.set('pending_cursor', data.next_pending_cursor);
+      if (data?.next_cursor) params.set('cursor', data.next_cursor);
+      if (!params.toString()) return all;
+      query = `?${params}`;
+    }
+  };
+
+  const fetchAllMoods = async (): Promise<{ moods: any[] }> => {
+    const moods: any[] = [];
+    let cursor: string | null | undefined = null;
+    do {
+      const data: any = await apiFetch<any>(
+        cursor ? `/mood/recent?cursor=${encodeURIComponent(cursor)}` : '/mood/recent'
+      );
+      moods.push(...(Array.isArray(data?.moods) ? data.moods : []));
+      cursor = data?.next_cursor;
+    } while (cursor);
+    return { moods };
+  };
+
   const formatRelativeTime = (iso?: string): { label: string; sortTime: number } => {
     if (!iso) return { label: '—', sortTime: 0 };
     const d = new Date(iso);
@@ -334,12 +366,12 @@ const Dashboard: React.FC = () => {
       ] = await Promise.allSettled([
         apiFetch<WaterTodayResponse>('/water/today'),
         apiFetch<any>('/water/week'),
-        apiFetch<any>('/mood/recent'),
+        fetchAllMoods(),
         apiFetch<any>('/mood/average'),
         apiFetch<StudyStreakResponse>('/study/streak'),
-        apiFetch<StudyTasksResponse>('/study/tasks'),
+        fetchAllTasks(),
         apiFetch<any>('/study/history'),
-        apiFetch<any>('/workout/history'),
+        apiFetch<any>('/workout/history?include=exercises'),
         apiFetch<any>('/focus/history'),
         apiFetch<any>('/gratitude/recent'),
         apiFetch<any>('/journal/recent'),
@@ -369,7 +401,7 @@ const Dashboard: React.FC = () => {
 
       if (moodRecentRes.status === 'fulfilled') {
         const data = moodRecentRes.value;
-        const arr: any[] = Array.isArray(data) ? data : data?.entries ?? data?.recent ?? [];
+        const arr: any[] = Array.isArray(data) ? data : data?.moods ?? data?.entries ?? data?.recent ?? [];
         const normalized: MoodEntry[] = (Array.isArray(arr) ? arr : [])
           .map((x) => ({
             id: x?.id,
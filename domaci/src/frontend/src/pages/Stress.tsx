@@ -73,7 +73,21 @@ async function apiFetch<T>(
 }
 
 type SoundscapeKind = 'rain' | 'forest' | 'white';
-type RecentMoodsResponse = { moods: MoodEntry[] };
+type RecentMoodsResponse = { moods: MoodEntry[]; next_cursor?: string | null };
+
+// /mood/recent is paged; follow next_cursor so no check-in from the 14-day window is dropped
+async function fetchRecentMoods(): Promise<MoodEntry[]> {
+  const moods: MoodEntry[] = [];
+  let cursor: string | null | undefined = null;
+  do {
+    const page: RecentMoodsResponse = await apiFetch<RecentMoodsResponse>(
+      cursor ? `/mood/recent?cursor=${encodeURIComponent(cursor)}` : '/mood/recent'
+    );
+    if (Array.isArray(page?.moods)) moods.push(...page.moods);
+    cursor = page?.next_cursor;
+  } while (cursor);
+  return moods;
+}
 
 function createNoiseBuffer(ctx: AudioContext, seconds = 2): AudioBuffer {
   const sampleRate = ctx.sampleRate;
@@ -133,12 +147,12 @@ const Stress: React.FC = () => {
   }, []);
 
   const refreshMood = useCallback(async () => {
-    const [recentRes, avgRaw] = await Promise.all([
-      apiFetch<RecentMoodsResponse>('/mood/recent'),
+    const [recentMoods, avgRaw] = await Promise.all([
+      fetchRecentMoods(),
       apiFetch<WeeklyMoodAverage>('/mood/average'),
     ]);
 
-    setRecentMoods(Array.isArray(recentRes?.moods) ? recentRes.moods : []);
+    setRecentMoods(recentMoods);
 
     const avg =
       typeof avgRaw?.average === 'number'
@@ -12,6 +12,13 @@ interface StudyTask {
   completed_at: string | null;
 }
 
+interface StudyTasksPage {
+  pending: StudyTask[];
+  completed: StudyTask[];
+  next_pending_cursor: string | null;
+  next_cursor: string | null;
+}
+
 interface StudyStreak {
   current_streak: number;
   longest_streak: number;
@@ -172,15 +179,27 @@ const Study: React.FC = () => {
 
   const fetchTasks = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/study/tasks`, {
-        method: 'GET',
-        credentials: 'include',
-      });
-
-      if (response.ok) {
-        const data = await response.json();
-        setTasks(data);
+      // Both lists are paged; follow each cursor until the server has sent every task
+      const all = { pending: [] as StudyTask[], completed: [] as StudyTask[] };
+      let query = '';
+      while (true) {
+        const response = await fetch(`${API_BASE_URL}/study/tasks${query}`, {
+          method: 'GET',
+          credentials: 'include',
+        });
+        if (!response.ok) return;
+
+        const data: StudyTasksPage = await response.json();
+        all.pending.push(...data.pending);
+        all.completed.push(...data.completed);
+
+        const params = new URLSearchParams();
+        if (data.next_pending_cursor) params.set('pending_cursor', data.next_pending_cursor);
+        if (data.next_cursor) params.set('cursor', data.next_cursor);
+        if (!params.toString()) break;
+        query = `?${params}`;
       }
+      setTasks(all);
     } catch (error) {
       console.error('Error fetching tasks:', error);
     }